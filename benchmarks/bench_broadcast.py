@@ -0,0 +1,118 @@
+"""Broadcast completion time for N recipients against the bundled fake Bot API.
+
+Starts ``evai_bot.fake_telegram`` in-process with injected latency and a
+flood limit (HTTP 429 + ``retry_after``), then broadcasts one message to
+``--recipients`` chats:
+
+- ``sender``: ``TelegramSender.send_many`` alone (network + rate limiting);
+- ``job``: the admin path — ``create_broadcast_job`` + ``BroadcastRunner``,
+  including the outbox write-back, measured until the job is ``done``.
+
+Usage:
+    uv run python benchmarks/bench_broadcast.py --recipients 1000 --latency-ms 80 --server-rate 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import time
+from pathlib import Path
+
+_tmp = Path(tempfile.mkdtemp(prefix="evai-bench-"))
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp / 'bench.db'}"
+
+import uvicorn  # noqa: E402
+
+from evai_bot.config import Settings  # noqa: E402
+from evai_bot.db import init_db  # noqa: E402
+from evai_bot.fake_telegram import FakeTelegram, FakeTelegramStats, create_fake_telegram_app  # noqa: E402
+from evai_bot.jobs import broadcast_runner, create_broadcast_job, job_progress  # noqa: E402
+from evai_bot.telegram_sender import OutgoingMessage, TelegramSender  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _report(name: str, n: int, elapsed: float, sent: int, failed: int, fake: FakeTelegram) -> None:
+    stats = fake.stats.as_dict()
+    print(
+        f"{name:<7} recipients={n} time={elapsed:.2f}s rate={n / elapsed:,.1f} msg/s"
+        f" sent={sent} failed={failed} api_requests={stats['total']} throttled(429)={stats['throttled']}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipients", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="fake Bot API response time")
+    parser.add_argument("--jitter-ms", type=float, default=40.0)
+    parser.add_argument("--server-rate", type=float, default=30.0, help="fake flood limit, requests/s (0 = off)")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=None, help="sender TG_RATE_LIMIT (default from settings)")
+    parser.add_argument("--concurrency", type=int, default=None, help="sender TG_SEND_CONCURRENCY")
+    parser.add_argument("--mode", choices=["sender", "job", "both"], default="both")
+    args = parser.parse_args()
+
+    fake = FakeTelegram(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_limit=args.server_rate,
+        retry_after=args.retry_after,
+    )
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(create_fake_telegram_app(fake), host="127.0.0.1", port=port, log_level="warning")
+    )
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    os.environ["TELEGRAM_API_BASE"] = f"http://127.0.0.1:{port}"
+    if args.rate is not None:
+        os.environ["TG_RATE_LIMIT"] = str(args.rate)
+    if args.concurrency is not None:
+        os.environ["TG_SEND_CONCURRENCY"] = str(args.concurrency)
+    settings = Settings()
+    print(
+        f"fake api latency={args.latency_ms}±{args.jitter_ms}ms flood limit={args.server_rate}/s;"
+        f" sender rate={settings.tg_rate_limit}/s concurrency={settings.tg_send_concurrency}"
+    )
+    chat_ids = [200_000 + i for i in range(args.recipients)]
+    payload = {"text": "Бенчмарк рассылки"}
+
+    try:
+        if args.mode in ("sender", "both"):
+            sender = TelegramSender.from_settings(settings)
+            report = await sender.send_many(OutgoingMessage(c, "sendMessage", payload) for c in chat_ids)
+            _report("sender", args.recipients, report.elapsed, report.sent, report.failed, fake)
+
+        if args.mode in ("job", "both"):
+            fake.stats = FakeTelegramStats()
+            await asyncio.sleep(args.retry_after)  # let a flood block from the previous run expire
+            init_db()
+            t0 = time.perf_counter()
+            job_id = create_broadcast_job(
+                kind="message", title="bench", method="sendMessage", payload=payload, chat_ids=chat_ids
+            )
+            broadcast_runner.submit(job_id)
+            while True:
+                progress = job_progress(job_id) or {}
+                if progress.get("status") == "done":
+                    break
+                await asyncio.sleep(0.1)
+            _report("job", args.recipients, time.perf_counter() - t0, progress["sent"], progress["failed"], fake)
+    finally:
+        server.should_exit = True
+        await server_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+"""Mixed read/write throughput: SQLite defaults vs. the tuned profile in ``db.py``.
+
+Writer threads mimic ``record_answer_and_advance`` (insert an answer, bump
+the run, commit). Reader threads run the aggregate behind the survey results
+page (answers joined to completed runs, grouped by choice). Both profiles run
+the same workload on a fresh seeded database for ``--seconds``.
+
+Usage:
+    uv run python benchmarks/bench_sqlite_profile.py --seconds 5 --writers 4 --readers 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "bench")
+
+from sqlalchemy import Engine, func, update  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlmodel import Session, SQLModel, select  # noqa: E402
+
+from evai_bot.config import Settings  # noqa: E402
+from evai_bot.db import build_engine  # noqa: E402
+from evai_bot.models import SurveyAnswer, SurveyRun, User  # noqa: E402
+
+DEFAULTS = {
+    "SQLITE_JOURNAL_MODE": "",
+    "SQLITE_SYNCHRONOUS": "",
+    "SQLITE_BUSY_TIMEOUT_MS": "",
+    "SQLITE_MMAP_SIZE": "",
+    "SQLITE_CACHE_SIZE": "",
+    "SQLITE_TEMP_STORE": "",
+    "DB_POOL_SIZE": 5,
+    "DB_MAX_OVERFLOW": 10,
+}
+
+
+def _seed(eng: Engine, users: int) -> list[int]:
+    SQLModel.metadata.create_all(eng)
+    with Session(eng) as s:
+        us = [User(tg_id=i, first_name=f"Guest {i}") for i in range(users)]
+        s.add_all(us)
+        s.flush()
+        runs = [SurveyRun(user_id=u.id or 0, survey_key="registration", completed_at=datetime.utcnow()) for u in us]
+        s.add_all(runs)
+        s.flush()
+        for r in runs:
+            s.add(SurveyAnswer(run_id=r.id or 0, question_id="name", answer_text="Guest"))
+            s.add(SurveyAnswer(run_id=r.id or 0, question_id="profession", answer_choice=f"c{(r.id or 0) % 7}"))
+        s.commit()
+        return [r.id or 0 for r in runs]
+
+
+def _run(label: str, overrides: dict[str, object], seconds: float, writers: int, readers: int, users: int) -> None:
+    path = Path(tempfile.mkdtemp(prefix="evai-bench-")) / "bench.db"
+    settings = Settings(DATABASE_URL=f"sqlite:///{path}", **overrides)  # type: ignore[arg-type]
+    eng = build_engine(settings)
+    run_ids = _seed(eng, users)
+    stop = time.monotonic() + seconds
+    lock = threading.Lock()
+    stats = {"writes": 0, "reads": 0, "errors": 0}
+    write_lat: list[float] = []
+
+    def writer(n: int) -> None:
+        i = n
+        while time.monotonic() < stop:
+            run_id = run_ids[i % len(run_ids)]
+            i += writers
+            t0 = time.perf_counter()
+            try:
+                with Session(eng) as s:
+                    s.add(SurveyAnswer(run_id=run_id, question_id="fun_fact", answer_text="x" * 40))
+                    s.execute(update(SurveyRun).where(SurveyRun.id == run_id).values(current_index=SurveyRun.current_index + 1))
+                    s.commit()
+            except OperationalError:
+                with lock:
+                    stats["errors"] += 1
+                continue
+            with lock:
+                stats["writes"] += 1
+                write_lat.append((time.perf_counter() - t0) * 1000)
+
+    def reader() -> None:
+        stmt = (
+            select(SurveyAnswer.question_id, SurveyAnswer.answer_choice, func.count())
+            .join(SurveyRun, SurveyRun.id == SurveyAnswer.run_id)
+            .where(SurveyRun.completed_at.is_not(None))
+            .group_by(SurveyAnswer.question_id, SurveyAnswer.answer_choice)
+        )
+        while time.monotonic() < stop:
+            try:
+                with Session(eng) as s:
+                    s.exec(stmt).all()
+            except OperationalError:
+                with lock:
+                    stats["errors"] += 1
+                continue
+            with lock:
+                stats["reads"] += 1
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    eng.dispose()
+    write_lat.sort()
+    p99 = write_lat[int(len(write_lat) * 0.99)] if write_lat else 0.0
+    print(
+        f"{label:<8} writes/s={stats['writes'] / seconds:,.0f} reads/s={stats['reads'] / seconds:,.1f} "
+        f"write p99={p99:.1f}ms locked-errors={stats['errors']}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--users", type=int, default=3000)
+    args = parser.parse_args()
+    _run("default", DEFAULTS, args.seconds, args.writers, args.readers, args.users)
+    _run("tuned", {}, args.seconds, args.writers, args.readers, args.users)
+
+
+if __name__ == "__main__":
+    main()
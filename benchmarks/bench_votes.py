@@ -0,0 +1,113 @@
+"""Sustained live-poll vote ingestion: per-vote transactions vs. the write-behind buffer.
+
+Simulates a burst of taps on a live poll: ``--users`` guests vote ``--taps``
+times each (changing their mind), with ``--concurrency`` handlers in flight.
+
+- ``direct``: every tap runs its own SELECT + INSERT/UPDATE + COMMIT
+  (``engine.arecord_live_vote``, the pre-buffer path of ``cb_livepoll``);
+- ``buffer``: taps go to ``live.vote_buffer`` and are flushed in bulk.
+
+Throughput is measured until every vote is durable in the DB.
+
+Usage:
+    uv run python benchmarks/bench_votes.py --users 500 --taps 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+_tmp = Path(tempfile.mkdtemp(prefix="evai-bench-"))
+os.environ.setdefault("BOT_TOKEN", "bench")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp / 'bench.db'}"
+
+from sqlalchemy import func  # noqa: E402
+from sqlmodel import select  # noqa: E402
+
+from evai_bot.db import get_session, init_db  # noqa: E402
+from evai_bot.live import VoteBuffer, live_tallies  # noqa: E402
+from evai_bot.models import LivePollVote, User  # noqa: E402
+from evai_bot.surveys import engine as eng  # noqa: E402
+
+
+def _seed_users(n: int) -> list[int]:
+    with get_session() as session:
+        users = [User(tg_id=10_000 + i) for i in range(n)]
+        session.add_all(users)
+        session.commit()
+        return [u.id or 0 for u in users]
+
+
+def _vote_count(survey_key: str) -> int:
+    with get_session() as session:
+        return session.exec(
+            select(func.count()).select_from(LivePollVote).where(LivePollVote.survey_key == survey_key)
+        ).one()
+
+
+async def _drive(taps: list[tuple[int, str]], concurrency: int, handle) -> list[float]:  # type: ignore[no-untyped-def]
+    queue: asyncio.Queue[tuple[int, str]] = asyncio.Queue()
+    for t in taps:
+        queue.put_nowait(t)
+    acks: list[float] = []
+
+    async def worker() -> None:
+        while not queue.empty():
+            user_id, value = queue.get_nowait()
+            t0 = time.perf_counter()
+            await handle(user_id, value)
+            acks.append((time.perf_counter() - t0) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return acks
+
+
+def _report(name: str, n: int, elapsed: float, acks: list[float]) -> None:
+    acks.sort()
+    p50 = acks[len(acks) // 2]
+    p99 = acks[min(len(acks) - 1, int(len(acks) * 0.99))]
+    print(f"{name:<7} votes={n} time={elapsed:.2f}s rate={n / elapsed:,.0f} votes/s ack p50={p50:.2f}ms p99={p99:.2f}ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--taps", type=int, default=4, help="votes per user")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--flush-ms", type=int, default=200)
+    args = parser.parse_args()
+
+    init_db()
+    user_ids = _seed_users(args.users)
+    live_tallies.ensure_loaded()
+    taps = [(uid, "yes" if (uid + t) % 2 else "no") for t in range(args.taps) for uid in user_ids]
+
+    async def direct(user_id: int, value: str) -> None:
+        await eng.arecord_live_vote(user_id, "bench_direct", "q1", value)
+
+    t0 = time.perf_counter()
+    acks = await _drive(taps, args.concurrency, direct)
+    _report("direct", len(taps), time.perf_counter() - t0, acks)
+    assert _vote_count("bench_direct") == args.users
+
+    buffer = VoteBuffer(flush_interval=args.flush_ms / 1000.0, max_pending=500)
+
+    async def buffered(user_id: int, value: str) -> None:
+        buffer.add(user_id, "bench_buffer", "q1", value)
+
+    buffer.start()
+    t0 = time.perf_counter()
+    acks = await _drive(taps, args.concurrency, buffered)
+    await buffer.stop()
+    _report("buffer", len(taps), time.perf_counter() - t0, acks)
+    assert _vote_count("bench_buffer") == args.users
+    print(f"buffer flushes={buffer.flushes} rows written={buffer.flushed_votes}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
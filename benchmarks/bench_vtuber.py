@@ -0,0 +1,112 @@
+"""VTuber ``speak`` latency: pooled client vs. a new HTTP client per call.
+
+Starts ``evai_bot.fake_vtuber`` in-process with injected latency, then sends
+``--calls`` speak commands, ``--concurrency`` at a time:
+
+- ``per-call``: a fresh ``httpx.AsyncClient`` for every call (how
+  ``VtuberClient`` used to work: a new TCP connection each time);
+- ``pooled``: one ``VtuberClient`` with keep-alive connections.
+
+Reports mean/p50/p95/max latency and the TCP connections the server saw.
+
+Usage:
+    uv run python benchmarks/bench_vtuber.py --calls 500 --latency-ms 5 --concurrency 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from evai_bot.fake_vtuber import FakeVtuber, FakeVtuberStats, create_fake_vtuber_app  # noqa: E402
+from evai_bot.vtuber_client import VtuberClient  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _measure(calls: int, concurrency: int, speak: Callable[[int], Awaitable[object]]) -> List[float]:
+    latencies: List[float] = []
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(calls):
+        queue.put_nowait(i)
+
+    async def worker() -> None:
+        while not queue.empty():
+            i = queue.get_nowait()
+            t0 = time.perf_counter()
+            await speak(i)
+            latencies.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return latencies
+
+
+def _report(name: str, latencies: List[float], elapsed: float, fake: FakeVtuber) -> None:
+    ms = sorted(x * 1000 for x in latencies)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    print(
+        f"{name:<9} calls={len(ms)} mean={statistics.fmean(ms):.2f}ms p50={statistics.median(ms):.2f}ms"
+        f" p95={p95:.2f}ms max={ms[-1]:.2f}ms throughput={len(ms) / elapsed:,.0f}/s"
+        f" connections={fake.stats.connections}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="fake VTuber API response time")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeVtuber(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(create_fake_vtuber_app(fake), host="127.0.0.1", port=port, log_level="warning")
+    )
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    base_url = f"http://127.0.0.1:{port}"
+    print(f"fake vtuber latency={args.latency_ms}±{args.jitter_ms}ms calls={args.calls} concurrency={args.concurrency}")
+
+    async def per_call(i: int) -> object:
+        async with httpx.AsyncClient(timeout=20.0) as client:
+            resp = await client.post(f"{base_url}/v1/control/speak", json={"text": f"line {i}"})
+            resp.raise_for_status()
+            return resp.json()
+
+    pooled_client = VtuberClient(base_url, max_connections=max(1, args.concurrency))
+
+    async def pooled(i: int) -> object:
+        return await pooled_client.speak(text=f"line {i}")
+
+    try:
+        for name, speak in (("per-call", per_call), ("pooled", pooled)):
+            fake.stats = FakeVtuberStats()
+            await speak(-1)  # warm-up (imports, first connection)
+            t0 = time.perf_counter()
+            latencies = await _measure(args.calls, args.concurrency, speak)
+            _report(name, latencies, time.perf_counter() - t0, fake)
+    finally:
+        await pooled_client.aclose()
+        server.should_exit = True
+        await server_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
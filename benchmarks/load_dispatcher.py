@@ -0,0 +1,250 @@
+"""End-to-end load test: synthetic updates fed through the bot's Dispatcher.
+
+Every simulated guest runs the real router from ``evai_bot.bot``:
+``/start`` -> "Заполнить анкету" -> the whole registration survey (text
+answers as messages, choice answers by pressing the button the bot actually
+sent) -> ``--taps`` votes on a live poll. Updates go through
+``Dispatcher.feed_update`` with a mocked Bot session, so no network is
+involved except the optional ``--api-latency-ms`` delay per Bot API call.
+
+A guest's updates are sequential, guests run in parallel and at most
+``--concurrency`` updates are in flight. Reported per update kind: handler
+latency p50/p95/p99 and mean DB time (SQL statements executed on behalf of
+the update), plus overall throughput.
+
+Usage:
+    uv run python benchmarks/load_dispatcher.py --users 500 --concurrency 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextvars
+import itertools
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+_tmp = Path(tempfile.mkdtemp(prefix="evai-bench-"))
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp / 'bench.db'}"
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.methods import TelegramMethod  # noqa: E402
+from aiogram.types import Message, Update  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from evai_bot.bot import create_dispatcher  # noqa: E402
+from evai_bot.db import engine, init_db  # noqa: E402
+from evai_bot.live import live_tallies, vote_buffer  # noqa: E402
+from evai_bot.surveys import engine as eng  # noqa: E402
+from evai_bot.user_cache import user_cache  # noqa: E402
+
+
+# ---- DB time attributed to the update being handled ----
+
+_db_time: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar("_db_time", default=None)
+
+
+# start time on the per-statement context (as in evai_bot.db), not a per-connection stack
+@event.listens_for(engine, "before_cursor_execute")
+def _before(conn: Any, cursor: Any, statement: str, params: Any, context: Any, executemany: bool) -> None:
+    if context is not None:
+        context._bench_started = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after(conn: Any, cursor: Any, statement: str, params: Any, context: Any, executemany: bool) -> None:
+    started = getattr(context, "_bench_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    acc = _db_time.get()  # run_db copies the context, so this is the update's list
+    if acc is not None:
+        acc[0] += elapsed
+
+
+# ---- mocked Bot API ----
+
+class FakeSession(BaseSession):
+    """Answers every Bot API call locally and remembers the last keyboard per chat."""
+
+    def __init__(self, latency: float) -> None:
+        super().__init__()
+        self.latency = latency
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.keyboards: Dict[int, List[str]] = {}
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: Optional[int] = None) -> Any:
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        chat_id = getattr(method, "chat_id", None)
+        markup = getattr(method, "reply_markup", None)
+        if chat_id is not None and markup is not None:
+            self.keyboards[int(chat_id)] = [
+                button.callback_data for row in markup.inline_keyboard for button in row if button.callback_data
+            ]
+        if method.__returning__ is Message:
+            return Message.model_validate(
+                {
+                    "message_id": next(self._message_ids),
+                    "date": int(time.time()),
+                    "chat": {"id": int(chat_id or 0), "type": "private"},
+                    "text": getattr(method, "text", None),
+                },
+                context={"bot": bot},
+            )
+        return True
+
+    async def stream_content(
+        self,
+        url: str,
+        headers: Optional[Dict[str, Any]] = None,
+        timeout: int = 30,
+        chunk_size: int = 65536,
+        raise_for_status: bool = True,
+    ) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+# ---- synthetic updates ----
+
+_update_ids = itertools.count(1)
+
+
+def _user(tg_id: int) -> Dict[str, Any]:
+    return {"id": tg_id, "is_bot": False, "first_name": f"Guest{tg_id}", "username": f"guest{tg_id}"}
+
+
+def message_update(tg_id: int, text: str) -> Dict[str, Any]:
+    return {
+        "update_id": next(_update_ids),
+        "message": {
+            "message_id": next(_update_ids),
+            "date": int(time.time()),
+            "chat": {"id": tg_id, "type": "private"},
+            "from": _user(tg_id),
+            "text": text,
+        },
+    }
+
+
+def callback_update(tg_id: int, data: str) -> Dict[str, Any]:
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "from": _user(tg_id),
+            "chat_instance": str(tg_id),
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": tg_id, "type": "private"},
+                "from": {"id": 1, "is_bot": True, "first_name": "bot"},
+                "text": "...",
+            },
+        },
+    }
+
+
+class LoadRunner:
+    def __init__(self, concurrency: int, latency: float) -> None:
+        self.session = FakeSession(latency)
+        self.bot = Bot(token=os.environ["BOT_TOKEN"], session=self.session)
+        self.dp = create_dispatcher()
+        self.slots = asyncio.Semaphore(concurrency)
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.db_time: Dict[str, List[float]] = defaultdict(list)
+        self.errors = 0
+
+    async def feed(self, kind: str, raw: Dict[str, Any]) -> None:
+        update = Update.model_validate(raw, context={"bot": self.bot})
+        async with self.slots:
+            acc = [0.0]
+            token = _db_time.set(acc)
+            t0 = time.perf_counter()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                self.errors += 1
+            finally:
+                self.latency[kind].append((time.perf_counter() - t0) * 1000)
+                self.db_time[kind].append(acc[0] * 1000)
+                _db_time.reset(token)
+
+    async def guest(self, tg_id: int, poll: str, taps: int) -> None:
+        spec = eng.load_survey("registration")
+        await self.feed("/start", message_update(tg_id, "/start"))
+        await self.feed("survey:start", callback_update(tg_id, "survey:start:registration"))
+        for q in spec.questions:
+            if q.type == "choice":
+                options = self.session.keyboards.get(tg_id) or []
+                if options:
+                    await self.feed("survey:answer", callback_update(tg_id, random.choice(options)))
+            else:
+                await self.feed("text answer", message_update(tg_id, f"answer to {q.id}"))
+        for _ in range(taps):
+            await self.feed("livepoll", callback_update(tg_id, f"{poll}:{random.choice(['blue', 'red'])}"))
+
+
+def _pct(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def _report(runner: LoadRunner, elapsed: float) -> None:
+    total = sum(len(v) for v in runner.latency.values())
+    print(f"{'update':<14} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'db ms':>7}")
+    for kind, values in runner.latency.items():
+        db = runner.db_time[kind]
+        print(
+            f"{kind:<14} {len(values):>6} {_pct(values, 0.5):>8.2f} {_pct(values, 0.95):>8.2f}"
+            f" {_pct(values, 0.99):>8.2f} {sum(db) / len(db):>7.2f}"
+        )
+    all_db = sum(sum(v) for v in runner.db_time.values())
+    print(f"updates={total} errors={runner.errors} time={elapsed:.2f}s throughput={total / elapsed:,.0f} updates/s")
+    print(f"db time total={all_db / 1000:.2f}s bot api calls={dict(runner.session.calls)}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100, help="updates in flight")
+    parser.add_argument("--taps", type=int, default=3, help="live poll votes per guest")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="simulated Bot API round trip")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    init_db()
+    live_tallies.ensure_loaded()
+    eng.active_runs.ensure_loaded()
+    poll = "livepoll:blue_red:choice_1"
+
+    runner = LoadRunner(args.concurrency, args.api_latency_ms / 1000.0)
+    vote_buffer.start()
+    user_cache.start()
+    t0 = time.perf_counter()
+    try:
+        await asyncio.gather(*(runner.guest(100_000 + i, poll, args.taps) for i in range(args.users)))
+    finally:
+        elapsed = time.perf_counter() - t0
+        await vote_buffer.stop()
+        await user_cache.stop()
+    _report(runner, elapsed)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
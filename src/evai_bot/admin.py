@@ -1,17 +1,44 @@
 from __future__ import annotations
 
-from typing import Annotated, Optional
+import hmac
+import re
+import time
+from datetime import datetime
+from typing import Annotated, Literal, Optional
+from urllib.parse import quote
 
 import uvicorn
-from fastapi import Depends, FastAPI, HTTPException, Query, Request, status
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi import Depends, FastAPI, Form, HTTPException, Query, Request, status
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse, JSONResponse, StreamingResponse
+from pydantic import Field
 
+from .bot import webhook_receiver
 from .config import Settings
 from .db import get_session, init_db
-from .models import SurveyAnswer, SurveyRun, User, LivePollVote, LivePollState
-from .vtuber_client import VtuberClient
-from .surveys.engine import load_survey, SURVEYS_DIR
-from pathlib import Path
+from .exports import ANSWER_COLUMNS, VOTE_COLUMNS, encode_csv, encode_ndjson, iter_answers, iter_votes
+from .live import live_tallies, vote_buffer
+from .metrics import ADMIN_REQUEST_SECONDS, ADMIN_RESPONSES, QUERIES_PER_UNIT, registry
+from .query_tracker import track_queries
+from .models import SurveyRun, User, LivePollState
+from .jobs import broadcast_runner, create_broadcast_job, job_progress
+from .telegram_sender import OutgoingMessage, shared_sender
+from .user_cache import user_cache
+from .users import (
+    MAX_INT64,
+    PAGE_SIZE,
+    decode_cursor,
+    delete_users,
+    display_name,
+    list_users_page,
+    search_users,
+    set_registered,
+    user_counts,
+)
+from .vtuber_client import vtuber_client
+from .vtuber_queue import VtuberCommand, vtuber_queue
+from .surveys.engine import SpecIndex, active_runs, list_survey_keys, load_survey, survey_registry
+from .surveys.results import survey_results
+from .surveys.tallies import read_tallies
 
 
 def _auth_dependency(
@@ -31,31 +58,152 @@ def _auth_dependency(
 Auth = Annotated[None, Depends(_auth_dependency)]
 
 
+def _job_progress_html(job_id: Optional[int]) -> str:
+    """Small progress block that polls /admin/jobs/{id} until the job is done."""
+    if not job_id:
+        return ""
+    return f"""
+    <div id='job' style='margin:10px 0; padding:8px; border:1px solid #ddd; background:#fafafa;'>Рассылка #{job_id}: …</div>
+    <script>
+      (function() {{
+        const el = document.getElementById('job');
+        const qs = window.location.search.includes('token=') ? '?' + window.location.search.slice(1).split('&').filter(p => p.startsWith('token=')).join('&') : '';
+        async function tick() {{
+          const r = await fetch('/admin/jobs/{job_id}' + qs);
+          if (!r.ok) return;
+          const j = await r.json();
+          el.textContent = `Рассылка #${{j.id}} (${{j.title}}): ${{j.status}} — отправлено ${{j.sent}}, ошибок ${{j.failed}}, осталось ${{j.remaining}} из ${{j.total}}, ${{j.msgs_per_sec}} msg/s`;
+          if (j.status !== 'done') setTimeout(tick, 1000);
+        }}
+        tick();
+      }})();
+    </script>
+    """
+
+
 def create_app() -> FastAPI:
     app = FastAPI(title="EVAI Admin", version="0.1.0")
 
+    @app.middleware("http")
+    async def _request_metrics(request: Request, call_next):  # type: ignore[no-untyped-def]
+        started = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            # route template, so /admin/users/1 and /admin/users/2 share a series
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            ADMIN_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=route)
+            ADMIN_RESPONSES.inc(method=request.method, route=route, status=str(status_code))
+
+    @app.middleware("http")
+    async def _query_tracking(request: Request, call_next):  # type: ignore[no-untyped-def]
+        with track_queries(f"{request.method} {request.url.path}") as stats:
+            response = await call_next(request)
+        # streamed bodies (exports, SSE) run their queries after this point
+        response.headers["X-Query-Count"] = str(stats.count)
+        response.headers["X-Query-Time-Ms"] = f"{stats.seconds * 1000:.1f}"
+        QUERIES_PER_UNIT.observe(stats.count, kind="admin")
+        return response
+
     @app.on_event("startup")
     def _startup() -> None:
         init_db()
+        live_tallies.ensure_loaded()
+        active_runs.ensure_loaded()
+
+    @app.on_event("startup")
+    async def _resume_jobs() -> None:
+        await broadcast_runner.resume_pending()
 
     @app.get("/", response_class=RedirectResponse, include_in_schema=False)
     def root(_: Auth):  # type: ignore[no-untyped-def]
         return RedirectResponse(url="/admin/users")
 
     @app.get("/admin/health")
-    def health() -> dict[str, str]:  # type: ignore[no-untyped-def]
-        return {"status": "ok"}
+    def health() -> dict[str, object]:  # type: ignore[no-untyped-def]
+        return {
+            "status": "ok",
+            "survey_cache": survey_registry.stats(),
+            "user_cache": user_cache.stats(),
+            "survey_results_cache": survey_results.stats(),
+        }
+
+    @app.get("/admin/metrics", response_class=PlainTextResponse)
+    def metrics(_: Auth) -> PlainTextResponse:  # type: ignore[no-untyped-def]
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+    settings = Settings()
+    if settings.webhook_url:
+        webhook_secret = settings.webhook_secret
+
+        @app.post(settings.webhook_path, include_in_schema=False)
+        async def telegram_webhook(request: Request) -> JSONResponse:
+            supplied = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            # Settings guarantees a secret in webhook mode; never accept an unsigned update
+            if not webhook_secret or not hmac.compare_digest(supplied.encode(), webhook_secret.encode()):
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+            try:
+                update = await request.json()
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON") from None
+            if not isinstance(update, dict):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Update must be an object")
+            if not webhook_receiver.feed(update):
+                # bot not started yet (or already stopped): Telegram will redeliver the update
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Bot not ready")
+            return JSONResponse({"ok": True})
+
+        @app.on_event("shutdown")
+        def _stop_webhook() -> None:
+            webhook_receiver.stop()
+
+    @app.on_event("shutdown")
+    async def _close_vtuber_client() -> None:
+        await vtuber_queue.stop()
+        await vtuber_client.aclose()
+
+    @app.get("/admin/jobs/{job_id}")
+    def job_status(job_id: int, _: Auth) -> dict[str, object]:  # type: ignore[no-untyped-def]
+        progress = job_progress(job_id)
+        if progress is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return progress
 
     @app.get("/admin/users", response_class=HTMLResponse)
-    def list_users(_: Auth) -> str:  # type: ignore[no-untyped-def]
-        with get_session() as session:
-            users = session.query(User).order_by(User.created_at.desc()).all()
+    def list_users(  # type: ignore[no-untyped-def]
+        _: Auth,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        q: Optional[str] = None,
+        status: Optional[str] = None,
+    ) -> str:
+        from html import escape
+
+        counts = user_counts()
+        query = (q or "").strip()
+        pager = ""
+        if query:
+            users = search_users(query, limit=PAGE_SIZE)
+            pager = "<a href='/admin/users'>← все пользователи</a>"
+        else:
+            page = list_users_page(after=decode_cursor(after), before=decode_cursor(before))
+            users = page.users
+            links = []
+            if page.prev_cursor:
+                links.append(f"<a href='/admin/users?before={quote(page.prev_cursor)}'>← newer</a>")
+            if page.next_cursor:
+                links.append(f"<a href='/admin/users?after={quote(page.next_cursor)}'>older →</a>")
+            pager = " &nbsp; ".join(links)
         rows = []
         for u in users:
-            name = " ".join(filter(None, [u.first_name, u.last_name])) or (u.username or "-")
+            name = escape(display_name(u))
             reg_badge = "✓" if u.is_registered else "✗"
             rows.append(
                 f"<tr>"
+                f"<td><input type='checkbox' name='user_id' value='{u.id}' form='bulk' /></td>"
                 f"<td>{u.id}</td>"
                 f"<td>{u.tg_id}</td>"
                 f"<td>{name}</td>"
@@ -72,7 +220,8 @@ def create_app() -> FastAPI:
                 f"</td>"
                 f"</tr>"
             )
-        body = "".join(rows) or "<tr><td colspan='5'>No users yet</td></tr>"
+        body = "".join(rows) or "<tr><td colspan='6'>No users yet</td></tr>"
+        status_html = f"<p><b>{escape(status)}</b></p>" if status else ""
         return f"""
         <html>
           <head>
@@ -96,9 +245,25 @@ def create_app() -> FastAPI:
               <a href='/admin/vtuber'>VTuber Control</a>
              </nav>
             <h1>Users</h1>
+            <p>Всего: <b>{counts['total']}</b> · зарегистрировано: <b>{counts['registered']}</b></p>
+            <form method='get' action='/admin/users' style='margin:10px 0;'>
+              <input type='text' name='q' value='{escape(query, quote=True)}' placeholder='Поиск: имя, username или tg_id' style='width:320px;padding:6px;' />
+              <button type='submit'>Найти</button>
+            </form>
+            {status_html}
+            <form id='bulk' method='post' action='/admin/users/bulk' style='margin:10px 0;'>
+              Отмеченные:
+              <button type='submit' name='action' value='register'>Зарегистрировать</button>
+              <button type='submit' name='action' value='unregister'>Снять регистрацию</button>
+              <button type='submit' name='action' value='toggle'>Toggle Registered</button>
+              <button type='submit' name='action' value='delete' style='color:#b00;'
+                onclick="return confirm('Delete selected users with all their answers and votes?');">Удалить</button>
+            </form>
             <table>
               <thead>
                 <tr>
+                  <th><input type='checkbox' title='Выбрать все'
+                    onclick="document.querySelectorAll('input[name=user_id]').forEach(c => c.checked = this.checked)" /></th>
                   <th>ID</th>
                   <th>tg_id</th>
                   <th>Name</th>
@@ -110,6 +275,7 @@ def create_app() -> FastAPI:
                 {body}
               </tbody>
             </table>
+            <p>{pager}</p>
           </body>
         </html>
         """
@@ -123,140 +289,53 @@ def create_app() -> FastAPI:
         """Display results for the Registration survey with a copy-all button.
         Readable text is grouped by participants: one block per user with Q: A lines.
         """
-        from collections import defaultdict, Counter
         import datetime as _dt
 
         # Only the registration survey is displayed on this page
-        reg_path = Path(SURVEYS_DIR) / "registration.json"
-        survey_files = [reg_path] if reg_path.exists() else []
-        if not survey_files:
+        survey_keys = [k for k in list_survey_keys() if k == "registration"]
+        if not survey_keys:
             return """
             <html><body><p>Registration survey not found.</p></body></html>
             """
 
         html_sections: list[str] = []
+        plain_blocks: list[str] = []
 
-        # Aggregates for building participant-grouped plain text
-        specs: dict[str, object] = {}
-        all_runs: list[SurveyRun] = []
-        answers_by_run: dict[int, list[SurveyAnswer]] = defaultdict(list)
-        all_user_ids: set[int] = set()
-
-        with get_session() as session:
-            for sf in survey_files:
-                key = sf.stem
-                try:
-                    spec = load_survey(key)
-                except Exception as e:  # noqa: BLE001
-                    html_sections.append(
-                        f"<section><h2>{key}</h2><p style='color:#b00;'>Survey file error: {e!s}</p></section>"
-                    )
-                    continue
-                specs[key] = spec
-                # runs and answers for this survey
-                runs = (
-                    session.query(SurveyRun)
-                    .filter((SurveyRun.survey_key == key) & (SurveyRun.completed_at.is_not(None)))
-                    .all()
+        for key in survey_keys:
+            try:
+                spec = load_survey(key)
+            except Exception as e:  # noqa: BLE001
+                html_sections.append(
+                    f"<section><h2>{key}</h2><p style='color:#b00;'>Survey file error: {e!s}</p></section>"
                 )
-                run_ids = [r.id for r in runs if r.id is not None]
-                if run_ids:
-                    answers = (
-                        session.query(SurveyAnswer)
-                        .filter(SurveyAnswer.run_id.in_(run_ids))
-                        .all()
-                    )
-                else:
-                    answers = []
-                for a in answers:
-                    if a.run_id is not None:
-                        answers_by_run[a.run_id].append(a)
-                all_runs.extend(runs)
-                all_user_ids.update(r.user_id for r in runs)
-
-                # HTML breakdown per survey (kept question-grouped for readability)
-                by_q: dict[str, list[SurveyAnswer]] = defaultdict(list)
-                for a in answers:
-                    by_q[a.question_id].append(a)
-                participants = len({r.user_id for r in runs})
-                html_rows: list[str] = [f"<h2>{spec.title}</h2>", f"<p class='muted'>Participants (completed): {participants}</p>"]
-                for q in spec.questions:
-                    q_answers = by_q.get(q.id, [])
-                    if q.type == "choice":
-                        counts = Counter([a.answer_choice or "" for a in q_answers])
-                        label_by_value = {c.value: c.label for c in (q.choices or [])}
-                        rows = []
-                        total = sum(counts.values()) or 1
-                        for value, label in label_by_value.items():
-                            n = counts.get(value, 0)
-                            pct = (n * 100.0) / total if total else 0.0
-                            rows.append(
-                                f"<tr><td>{label}</td><td style='text-align:right;'>{n}</td><td style='text-align:right;'>{pct:.1f}%</td></tr>"
-                            )
-                        table = (
-                            "<table><thead><tr><th>Option</th><th>Count</th><th>%</th></tr></thead>"
-                            f"<tbody>{''.join(rows) if rows else '<tr><td colspan=3>—</td></tr>'}</tbody></table>"
-                        )
-                        html_rows.append(f"<section><h3>{q.prompt}</h3>{table}</section>")
-                    else:
-                        # Skip free-text answers in breakdown to keep the page compact.
-                        continue
-                html_sections.append("\n".join(html_rows))
-
-            # Fetch all users for runs once
-            users = {u.id: u for u in session.query(User).filter(User.id.in_(all_user_ids)).all()} if all_user_ids else {}
-
-        # Build participant-grouped plain text
-        # Order users by name (fallback id)
-        def user_display(u: User) -> str:
-            name = " ".join(filter(None, [u.first_name, u.last_name]))
-            if name:
-                return name
-            if u.username:
-                return u.username
-            return f"user#{u.id}"
-
-        # Build mapping of questions for quick label lookup
-        qmap: dict[str, dict[str, object]] = {}
-        for key, spec in specs.items():
-            qmap[key] = {q.id: q for q in spec.questions}
-
-        # runs per user sorted by created_at
-        runs_by_user: dict[int, list[SurveyRun]] = defaultdict(list)
-        for r in all_runs:
-            runs_by_user[r.user_id].append(r)
-        for uid in runs_by_user:
-            runs_by_user[uid].sort(key=lambda r: r.created_at)
-
-        plain_parts: list[str] = []
-        # Sort users by display name
-        ordered_user_ids = sorted(all_user_ids, key=lambda uid: user_display(users.get(uid)) if users.get(uid) else str(uid))
-        for uid in ordered_user_ids:
-            u = users.get(uid)
-            if not u:
                 continue
-            plain_parts.append(user_display(u))
-            for run in runs_by_user.get(uid, []):
-                spec = specs.get(run.survey_key)
-                if not spec:
+            # choice counts come from the tally table; cached until a run of this survey completes
+            results = survey_results.get(spec)
+            plain_blocks.append(results.plain_text)
+
+            # HTML breakdown per survey (kept question-grouped for readability)
+            html_rows: list[str] = [f"<h2>{spec.title}</h2>", f"<p class='muted'>Participants (completed): {results.participants}</p>"]
+            for q in spec.questions:
+                if q.type != "choice":
+                    # Skip free-text answers in breakdown to keep the page compact.
                     continue
-                answers_list = answers_by_run.get(run.id or -1, [])
-                ans_by_q = {a.question_id: a for a in answers_list}
-                for q in spec.questions:
-                    a = ans_by_q.get(q.id)
-                    if not a:
-                        continue
-                    if q.type == "choice":
-                        label_by_value = {c.value: c.label for c in (q.choices or [])}
-                        val = a.answer_choice or ""
-                        out = label_by_value.get(val, val)
-                    else:
-                        out = (a.answer_text or "").replace("\n", " ").strip()
-                    if out:
-                        plain_parts.append(f"{q.prompt}: {out}")
-            plain_parts.append("")
-
-        plain_text = "\n".join(plain_parts)
+                counts = results.choice_counts.get(q.id, {})
+                rows = []
+                total = sum(counts.values()) or 1
+                for c in q.choices or []:
+                    n = counts.get(c.value, 0)
+                    pct = (n * 100.0) / total if total else 0.0
+                    rows.append(
+                        f"<tr><td>{c.label}</td><td style='text-align:right;'>{n}</td><td style='text-align:right;'>{pct:.1f}%</td></tr>"
+                    )
+                table = (
+                    "<table><thead><tr><th>Option</th><th>Count</th><th>%</th></tr></thead>"
+                    f"<tbody>{''.join(rows) if rows else '<tr><td colspan=3>—</td></tr>'}</tbody></table>"
+                )
+                html_rows.append(f"<section><h3>{q.prompt}</h3>{table}</section>")
+            html_sections.append("\n".join(html_rows))
+
+        plain_text = "\n".join(plain_blocks)
         escaped = plain_text.replace("<", "&lt;")
         generated_at = _dt.datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
         return f"""
@@ -289,6 +368,11 @@ def create_app() -> FastAPI:
             <div class='controls'>
               <button onclick="copyAll()">Copy all</button>
               <span id='copyStatus' class='muted' style='margin-left:8px;'></span>
+              <span class='muted' style='margin-left:16px;'>Export:
+                <a href='/admin/export/answers?survey_key=registration'>answers CSV</a> ·
+                <a href='/admin/export/answers?survey_key=registration&format=ndjson'>NDJSON</a> ·
+                <a href='/admin/export/votes'>live votes CSV</a>
+              </span>
             </div>
             <h2>Readable Text</h2>
             <pre id='readable'>{escaped}</pre>
@@ -318,6 +402,85 @@ def create_app() -> FastAPI:
         </html>
         """
 
+    def _export_response(name: str, columns: list[str], rows, fmt: str, survey_key: Optional[str]):  # type: ignore[no-untyped-def]
+        if fmt == "ndjson":
+            body, media_type, ext = encode_ndjson(columns, rows), "application/x-ndjson", "ndjson"
+        else:
+            body, media_type, ext = encode_csv(columns, rows), "text/csv; charset=utf-8", "csv"
+        filename = f"{name}-{survey_key or 'all'}.{ext}"
+        # survey_key comes from the query string: ASCII-only fallback plus RFC 5987 form
+        fallback = re.sub(r"[^A-Za-z0-9_.-]", "_", filename)
+        disposition = f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+        return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": disposition})
+
+    @app.get("/admin/api/surveys/{survey_key}/tallies")
+    def survey_tallies_api(  # type: ignore[no-untyped-def]
+        survey_key: str,
+        _: Auth,
+        completed: bool = False,
+    ):
+        """Choice counts per question for dashboards/projector screens; O(choices) rows.
+
+        Answers of runs still in progress are included unless ``completed=1``.
+        """
+        try:
+            spec = load_survey(survey_key)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Survey not found") from None
+        counts = read_tallies(survey_key, completed_only=completed)
+        return [
+            {
+                "question_id": q.id,
+                "prompt": q.prompt,
+                "choices": [
+                    {"value": c.value, "label": c.label, "count": counts.get(q.id, {}).get(c.value, 0)}
+                    for c in q.choices or []
+                ],
+            }
+            for q in spec.questions
+            if q.type == "choice"
+        ]
+
+    @app.get("/admin/export/answers")
+    def export_answers(  # type: ignore[no-untyped-def]
+        _: Auth,
+        format: Literal["csv", "ndjson"] = "csv",
+        survey_key: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ):
+        """Survey answers with run and user columns; ``since``/``until`` filter answer time (UTC)."""
+        rows = iter_answers(survey_key, since, until)
+        return _export_response("answers", ANSWER_COLUMNS, rows, format, survey_key)
+
+    @app.get("/admin/export/votes")
+    def export_votes(  # type: ignore[no-untyped-def]
+        _: Auth,
+        format: Literal["csv", "ndjson"] = "csv",
+        survey_key: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ):
+        """Live poll votes with user columns; ``since``/``until`` filter vote time (UTC)."""
+        rows = iter_votes(survey_key, since, until)
+        return _export_response("votes", VOTE_COLUMNS, rows, format, survey_key)
+
+    @app.get("/admin/api/users/search")
+    def users_search_api(  # type: ignore[no-untyped-def]
+        _: Auth, q: str = "", limit: int = Query(default=20, ge=1, le=100)
+    ) -> list[dict[str, object]]:
+        """Typeahead source for the user picker."""
+        return [
+            {
+                "id": u.id,
+                "tg_id": u.tg_id,
+                "name": display_name(u),
+                "username": u.username,
+                "is_registered": u.is_registered,
+            }
+            for u in search_users(q, limit=limit)
+        ]
+
     @app.post("/admin/users/{user_id}/toggle-registered")
     def toggle_registered(user_id: int, _: Auth):  # type: ignore[no-untyped-def]
         with get_session() as session:
@@ -327,51 +490,91 @@ def create_app() -> FastAPI:
             user.is_registered = not user.is_registered
             session.add(user)
             session.commit()
+        user_cache.invalidate(user_id)
         return RedirectResponse(url="/admin/users", status_code=303)
 
+    def _forget_users(deleted: dict[int, int]) -> None:
+        """Drop in-memory state of deleted users (user id -> tg_id)."""
+        for user_id, tg_id in deleted.items():
+            user_cache.invalidate(user_id)
+            active_runs.forget_user(tg_id)
+        live_tallies.forget_users(deleted)
+        survey_results.invalidate()
+
     @app.post("/admin/users/{user_id}/delete")
     def delete_user(user_id: int, _: Auth):  # type: ignore[no-untyped-def]
-        with get_session() as session:
-            user = session.get(User, user_id)
-            if not user:
-                raise HTTPException(status_code=404, detail="User not found")
-            # Cascade delete survey data
-            runs = session.query(SurveyRun).filter(SurveyRun.user_id == user_id).all()
-            for r in runs:
-                session.query(SurveyAnswer).filter(SurveyAnswer.run_id == r.id).delete()
-                session.delete(r)
-            session.delete(user)
-            session.commit()
+        vote_buffer.discard_users([user_id])
+        deleted = delete_users([user_id])
+        if not deleted:
+            raise HTTPException(status_code=404, detail="User not found")
+        _forget_users(deleted)
         return RedirectResponse(url="/admin/users", status_code=303)
 
+    @app.post("/admin/users/bulk")
+    def bulk_users(  # type: ignore[no-untyped-def]
+        _: Auth,
+        action: Annotated[Literal["delete", "register", "unregister", "toggle"], Form()],
+        user_id: Annotated[list[Annotated[int, Field(ge=1, le=MAX_INT64)]], Form(default_factory=list)],
+    ):
+        """Delete or change registration of the checked users in one transaction."""
+        ids = list(dict.fromkeys(user_id))
+        if not ids:
+            return RedirectResponse(url="/admin/users?status=" + quote("Никто не выбран"), status_code=303)
+        if action == "delete":
+            vote_buffer.discard_users(ids)
+            deleted = delete_users(ids)
+            _forget_users(deleted)
+            status_text = f"Удалено: {len(deleted)}"
+        else:
+            value = {"register": True, "unregister": False, "toggle": None}[action]
+            changed = set_registered(ids, value)
+            for changed_id in ids:
+                user_cache.invalidate(changed_id)
+            status_text = f"Обновлено: {changed}"
+        return RedirectResponse(url="/admin/users?status=" + quote(status_text), status_code=303)
+
     @app.get("/admin/users/{user_id}", response_class=HTMLResponse)
     def view_user(user_id: int, _: Auth) -> str:  # type: ignore[no-untyped-def]
+        from html import escape
+        from sqlalchemy.orm import selectinload
+        from sqlmodel import select
+
         with get_session() as session:
             user = session.get(User, user_id)
             if not user:
                 raise HTTPException(status_code=404, detail="User not found")
-            runs = (
-                session.query(SurveyRun)
-                .filter(SurveyRun.user_id == user_id)
+            # runs + all their answers in two round trips, however many runs there are
+            runs = session.exec(
+                select(SurveyRun)
+                .where(SurveyRun.user_id == user_id)
                 .order_by(SurveyRun.created_at.desc())
-                .all()
-            )
+                .options(selectinload(SurveyRun.answers))  # type: ignore[arg-type]
+            ).all()
+            indexes: dict[str, Optional[SpecIndex]] = {}
             blocks = []
             for r in runs:
-                answers = (
-                    session.query(SurveyAnswer)
-                    .filter(SurveyAnswer.run_id == r.id)
-                    .order_by(SurveyAnswer.created_at.asc())
-                    .all()
-                )
-                items = "".join(
-                    f"<tr><td>{a.created_at:%Y-%m-%d %H:%M:%S}</td><td>{a.question_id}</td><td>{a.answer_choice or ''}</td><td>{(a.answer_text or '').replace('<','&lt;')}</td></tr>"
-                    for a in answers
-                ) or "<tr><td colspan='4'>—</td></tr>"
+                if r.survey_key not in indexes:
+                    try:
+                        indexes[r.survey_key] = survey_registry.index(r.survey_key)
+                    except Exception:  # noqa: BLE001 - survey file removed/broken: show raw values
+                        indexes[r.survey_key] = None
+                index = indexes[r.survey_key]
+                empty = "<tr><td colspan='4'>—</td></tr>"
+                items = []
+                for a in r.answers:
+                    question = index.prompts.get(a.question_id, a.question_id) if index else a.question_id
+                    choice = a.answer_choice or ""
+                    if choice and index:
+                        choice = index.label(a.question_id, choice)
+                    items.append(
+                        f"<tr><td>{a.created_at:%Y-%m-%d %H:%M:%S}</td><td>{escape(question)}</td>"
+                        f"<td>{escape(choice)}</td><td>{escape(a.answer_text or '')}</td></tr>"
+                    )
                 status = "✓ completed" if r.completed_at else "… in progress"
                 blocks.append(
                     f"<h3>Run #{r.id} — {r.survey_key} — {status}</h3>"
-                    f"<table><thead><tr><th>Time</th><th>Question</th><th>Choice</th><th>Text</th></tr></thead><tbody>{items}</tbody></table>"
+                    f"<table><thead><tr><th>Time</th><th>Question</th><th>Choice</th><th>Text</th></tr></thead>"
+                    f"<tbody>{''.join(items) or empty}</tbody></table>"
                 )
 
         name = " ".join(filter(None, [user.first_name, user.last_name])) or (user.username or "-")
@@ -400,11 +603,10 @@ def create_app() -> FastAPI:
 
     # -------------------- Polls admin and Live view --------------------
     @app.get("/admin/polls", response_class=HTMLResponse)
-    def polls_admin(_: Auth) -> str:  # type: ignore[no-untyped-def]
+    def polls_admin(job: Optional[int] = None, _: Auth = None) -> str:  # type: ignore[no-untyped-def]
         # Collect all surveys and their choice questions
         scanned: list[tuple[str, object]] = []
-        for p in sorted(Path(SURVEYS_DIR).glob("*.json"), key=lambda x: x.stem):
-            fname_key = p.stem
+        for fname_key in list_survey_keys():
             if fname_key == "registration":
                 # Регистрационный опрос управляется отдельно и имеет свою страницу
                 continue
@@ -492,6 +694,7 @@ def create_app() -> FastAPI:
               <a href='/admin/vtuber'>VTuber Control</a>
             </nav>
             <h1>Live Polls</h1>
+            {_job_progress_html(job)}
             <h2>Опросы</h2>
             {quick_html}
           </body>
@@ -500,18 +703,8 @@ def create_app() -> FastAPI:
 
     # -------------------- Messages (broadcast and direct) --------------------
     @app.get("/admin/messages", response_class=HTMLResponse)
-    def messages_admin(status: Optional[str] = None, _: Auth = None) -> str:  # type: ignore[no-untyped-def]
-        with get_session() as session:
-            users = (
-                session.query(User)
-                .order_by(User.created_at.desc())
-                .all()
-            )
-        opts = "".join(
-            f"<option value='{u.id}'>#{u.id} — "
-            f"{(' '.join(filter(None,[u.first_name,u.last_name])) or (u.username or '-'))} — tg:{u.tg_id}</option>"
-            for u in users
-        ) or "<option disabled>—</option>"
+    def messages_admin(status: Optional[str] = None, job: Optional[int] = None, _: Auth = None) -> str:  # type: ignore[no-untyped-def]
+        counts = user_counts()
         note = (
             f"<p style='color:#090;'>✅ {status}</p>" if status else ""
         )
@@ -525,6 +718,8 @@ def create_app() -> FastAPI:
               form {{ margin: 12px 0; padding: 10px; border: 1px solid #ddd; }}
               label {{ display:block; margin:6px 0; }}
               input[type=text], textarea, select {{ width: 100%; padding: 6px; }}
+              .typeahead div {{ padding: 4px 6px; cursor: pointer; border-bottom: 1px solid #eee; }}
+              .typeahead div:hover {{ background: #f0f4ff; }}
               small {{ color:#666; }}
               nav a {{ margin-right: 12px; }}
               table {{ border-collapse: collapse; width: 100%; }}
@@ -542,6 +737,7 @@ def create_app() -> FastAPI:
             </nav>
             <h1>Сообщения</h1>
             {note}
+            {_job_progress_html(job)}
             <form method='post' action='/admin/messages/broadcast'>
               <h2>Броадкаст</h2>
               <label>Текст
@@ -557,8 +753,8 @@ def create_app() -> FastAPI:
                 </label>
                 <label style='flex:1;'>Кому
                   <select name='scope'>
-                    <option value='registered' selected>Только зарегистрированным</option>
-                    <option value='all'>Всем пользователям</option>
+                    <option value='registered' selected>Только зарегистрированным ({counts['registered']})</option>
+                    <option value='all'>Всем пользователям ({counts['total']})</option>
                   </select>
                 </label>
               </div>
@@ -569,11 +765,10 @@ def create_app() -> FastAPI:
             <form method='post' action='/admin/messages/send'>
               <h2>Отправить одному</h2>
               <label>Пользователь
-                <select name='user_id'>
-                  <option value='' selected>— выбери из списка —</option>
-                  {opts}
-                </select>
-                <small>Либо укажи tg_id/username ниже, если нет в списке.</small>
+                <input type='text' id='userSearch' autocomplete='off' placeholder='Начни вводить имя, username или tg_id' />
+                <input type='hidden' name='user_id' id='userId' />
+                <div id='userResults' class='typeahead'></div>
+                <small id='userPicked'>Либо укажи tg_id/username ниже, если нет в списке.</small>
               </label>
               <div style='display:flex; gap:12px;'>
                 <label style='flex:1;'>tg_id
@@ -596,6 +791,42 @@ def create_app() -> FastAPI:
               <label><input type='checkbox' name='no_preview'/> Отключить предпросмотр ссылок</label>
               <button type='submit'>Отправить</button>
             </form>
+            <script>
+              (function() {{
+                const input = document.getElementById('userSearch');
+                const results = document.getElementById('userResults');
+                const hidden = document.getElementById('userId');
+                const picked = document.getElementById('userPicked');
+                const token = new URLSearchParams(location.search).get('token');
+                let timer = null, seq = 0;
+                function esc(s) {{ return String(s ?? '').replace(/[&<>"']/g, c => ({{'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#39;'}})[c]); }}
+                input.addEventListener('input', () => {{
+                  hidden.value = '';
+                  clearTimeout(timer);
+                  const q = input.value.trim();
+                  if (!q) {{ results.innerHTML = ''; return; }}
+                  timer = setTimeout(async () => {{
+                    const mine = ++seq;
+                    const params = new URLSearchParams({{q: q}});
+                    if (token) params.set('token', token);
+                    const r = await fetch('/admin/api/users/search?' + params.toString());
+                    if (!r.ok || mine !== seq) return;
+                    const users = await r.json();
+                    results.innerHTML = users.map(u =>
+                      `<div data-id="${{u.id}}" data-label="${{esc(u.name)}} — tg:${{u.tg_id}}">#${{u.id}} — ${{esc(u.name)}}${{u.username ? ' (@' + esc(u.username) + ')' : ''}} — tg:${{u.tg_id}}</div>`
+                    ).join('') || '<small>Никого не нашли</small>';
+                  }}, 200);
+                }});
+                results.addEventListener('click', (e) => {{
+                  const el = e.target.closest('div[data-id]');
+                  if (!el) return;
+                  hidden.value = el.dataset.id;
+                  input.value = el.dataset.label;
+                  picked.textContent = 'Выбран пользователь #' + el.dataset.id;
+                  results.innerHTML = '';
+                }});
+              }})();
+            </script>
           </body>
         </html>
         """
@@ -603,7 +834,6 @@ def create_app() -> FastAPI:
     @app.post("/admin/messages/broadcast")
     def messages_broadcast(request: Request, _: Auth):  # type: ignore[no-untyped-def]
         import anyio
-        import httpx
         async def _parse() -> dict[str, str]:
             data = await request.form()
             return {k: str(v) for k, v in data.items()}
@@ -614,35 +844,33 @@ def create_app() -> FastAPI:
         no_preview = data.get("no_preview") is not None
         if not text:
             return RedirectResponse(url="/admin/messages?status=Текст%20пустой", status_code=303)
-        settings = Settings()
-        api_base = f"https://api.telegram.org/bot{settings.bot_token}"
         with get_session() as session:
-            q = session.query(User)
+            q = session.query(User.tg_id)
             if scope == "registered":
                 q = q.filter(User.is_registered.is_(True))
-            users = q.all()
+            chat_ids = [tg_id for (tg_id,) in q.all()]
         payload_common: dict[str, object] = {
             "text": text,
             "disable_web_page_preview": no_preview,
         }
         if parse != "plain":
             payload_common["parse_mode"] = parse
-        sent = 0
-        errors = 0
-        with httpx.Client(timeout=10) as client:
-            for u in users:
-                try:
-                    payload = {"chat_id": u.tg_id, **payload_common}
-                    client.post(f"{api_base}/sendMessage", json=payload)
-                    sent += 1
-                except Exception:
-                    errors += 1
-        return RedirectResponse(url=f"/admin/messages?status=Broadcast:%20sent%20{sent},%20errors%20{errors}", status_code=303)
+        job_id = create_broadcast_job(
+            kind="message",
+            title=text[:40],
+            method="sendMessage",
+            payload=payload_common,
+            chat_ids=chat_ids,
+        )
+        anyio.from_thread.run_sync(broadcast_runner.submit, job_id)
+        return RedirectResponse(
+            url=f"/admin/messages?status=Broadcast%20started%20({len(chat_ids)})&job={job_id}",
+            status_code=303,
+        )
 
     @app.post("/admin/messages/send")
     def messages_send(request: Request, _: Auth):  # type: ignore[no-untyped-def]
         import anyio
-        import httpx
         async def _parse() -> dict[str, str]:
             data = await request.form()
             return {k: str(v) for k, v in data.items()}
@@ -673,33 +901,24 @@ def create_app() -> FastAPI:
             target_tg = int(tg_id_s)
         if not target_tg:
             return RedirectResponse(url="/admin/messages?status=Не%20нашёл%20пользователя", status_code=303)
-        settings = Settings()
-        api_base = f"https://api.telegram.org/bot{settings.bot_token}"
         payload: dict[str, object] = {
-            "chat_id": target_tg,
             "text": text,
             "disable_web_page_preview": no_preview,
         }
         if parse != "plain":
             payload["parse_mode"] = parse
-        ok = True
-        try:
-            httpx.post(f"{api_base}/sendMessage", json=payload, timeout=10)
-        except Exception:
-            ok = False
-        status = "OK" if ok else "Ошибка отправки"
+        result = anyio.from_thread.run(shared_sender().send, OutgoingMessage(target_tg, "sendMessage", payload))
+        status = "OK" if result.ok else f"Ошибка отправки: {result.error}"
         return RedirectResponse(url=f"/admin/messages?status={status}", status_code=303)
 
-    def _broadcast_poll(survey_key: str, question_id: str) -> tuple[int, int]:
-        from .surveys.engine import load_survey
-        import httpx
+    def _broadcast_poll(survey_key: str, question_id: str) -> Optional[int]:
+        """Queue the poll question for all registered users; returns the job id."""
+        import anyio
         # validate
         spec = load_survey(survey_key)
         q = next((qq for qq in spec.questions if qq.id == question_id and qq.type == "choice"), None)
         if not q or not q.choices:
-            return (0, 0)
-        settings = Settings()
-        api_base = f"https://api.telegram.org/bot{settings.bot_token}"
+            return None
         text = f"{spec.title}\n\n{q.prompt}"
         kb = {
             "inline_keyboard": [
@@ -711,32 +930,23 @@ def create_app() -> FastAPI:
         }
         # optional image for this question/survey
         image_url = getattr(q, "image_url", None) or getattr(spec, "image_url", None)
-        sent = 0
-        errors = 0
+        if image_url:
+            method, payload = "sendPhoto", {"photo": image_url, "caption": text, "reply_markup": kb}
+        else:
+            method, payload = "sendMessage", {"text": text, "reply_markup": kb}
         with get_session() as session:
-            users = session.query(User).filter(User.is_registered.is_(True)).all()
-        with httpx.Client(timeout=10) as client:
-            for u in users:
-                try:
-                    if image_url:
-                        client.post(
-                            f"{api_base}/sendPhoto",
-                            json={
-                                "chat_id": u.tg_id,
-                                "photo": image_url,
-                                "caption": text,
-                                "reply_markup": kb,
-                            },
-                        )
-                    else:
-                        client.post(
-                            f"{api_base}/sendMessage",
-                            json={"chat_id": u.tg_id, "text": text, "reply_markup": kb},
-                        )
-                    sent += 1
-                except Exception:
-                    errors += 1
-        return (sent, errors)
+            chat_ids = [
+                tg_id for (tg_id,) in session.query(User.tg_id).filter(User.is_registered.is_(True)).all()
+            ]
+        job_id = create_broadcast_job(
+            kind="poll",
+            title=f"{spec.key}/{q.id}",
+            method=method,
+            payload=payload,
+            chat_ids=chat_ids,
+        )
+        anyio.from_thread.run_sync(broadcast_runner.submit, job_id)
+        return job_id
 
     @app.post("/admin/polls/start")
     def polls_start(request: Request, _: Auth):  # type: ignore[no-untyped-def]
@@ -753,9 +963,10 @@ def create_app() -> FastAPI:
             state = LivePollState(survey_key=survey_key, question_id=question_id, image_url=None)
             session.add(state)
             session.commit()
-        # Auto-broadcast upon start
-        _broadcast_poll(survey_key, question_id)
-        return RedirectResponse(url="/admin/polls", status_code=303)
+        live_tallies.question_changed(survey_key)
+        # Auto-broadcast upon start (runs in the background)
+        job_id = _broadcast_poll(survey_key, question_id)
+        return RedirectResponse(url=f"/admin/polls?job={job_id}" if job_id else "/admin/polls", status_code=303)
 
     @app.post("/admin/polls/stop")
     def polls_stop(_: Auth):  # type: ignore[no-untyped-def]
@@ -774,9 +985,8 @@ def create_app() -> FastAPI:
         data = anyio.from_thread.run(_parse)
         survey_key = (data.get("survey_key") or "").strip()
         question_id = (data.get("question_id") or "").strip()
-        if survey_key and question_id:
-            _broadcast_poll(survey_key, question_id)
-        return RedirectResponse(url="/admin/polls", status_code=303)
+        job_id = _broadcast_poll(survey_key, question_id) if survey_key and question_id else None
+        return RedirectResponse(url=f"/admin/polls?job={job_id}" if job_id else "/admin/polls", status_code=303)
 
     @app.get("/live/survey/{survey_key}", response_class=HTMLResponse)
     def live_view(survey_key: str) -> str:  # type: ignore[no-untyped-def]
@@ -839,10 +1049,7 @@ def create_app() -> FastAPI:
                 window._valuePluginRegistered = true;
               }}
 
-              async function fetchData() {{
-                const r = await fetch('/live/api/survey/{survey_key}');
-                if (!r.ok) return;
-                const data = await r.json();
+              function render(data) {{
                 // labels without counts — counts are drawn inside bars
                 const many = (data.labels || []).length > 6;
                 const cfg = {{
@@ -864,22 +1071,61 @@ def create_app() -> FastAPI:
                   }}
                 }};
                 if (!chart) {{ chart = new Chart(ctx, cfg); }}
-                else {{ chart.data.labels = (data.labels || []); chart.data.datasets[0].data = data.counts; chart.update(); }}
+                else {{
+                  chart.data.labels = (data.labels || []);
+                  chart.data.datasets[0].data = data.counts;
+                  chart.data.datasets[0].backgroundColor = (data.colors || '#3b82f6');
+                  chart.data.datasets[0].borderColor = (data.colors || '#3b82f6');
+                  chart.update();
+                }}
+              }}
+
+              async function fetchData() {{
+                const r = await fetch('/live/api/survey/{survey_key}');
+                if (!r.ok) return;
+                render(await r.json());
+              }}
+
+              // Push updates via SSE; fall back to polling while the stream is down
+              let pollTimer = null;
+              function startPolling() {{
+                if (pollTimer) return;
+                fetchData();
+                pollTimer = setInterval(fetchData, 2000);
+              }}
+              function stopPolling() {{
+                if (!pollTimer) return;
+                clearInterval(pollTimer);
+                pollTimer = null;
+              }}
+              if (window.EventSource) {{
+                let current = null;
+                const es = new EventSource('/live/stream/survey/{survey_key}');
+                es.addEventListener('init', (e) => {{
+                  current = JSON.parse(e.data);
+                  stopPolling();
+                  render(current);
+                }});
+                es.addEventListener('counts', (e) => {{
+                  if (!current) return;
+                  current.counts = JSON.parse(e.data).counts;
+                  render(current);
+                }});
+                es.onerror = () => startPolling();
+              }} else {{
+                startPolling();
               }}
-              fetchData();
-              setInterval(fetchData, 2000);
             </script>
           </body>
         </html>
         """
 
-    @app.get("/live/api/survey/{survey_key}", response_class=JSONResponse)
-    def live_api(survey_key: str):  # type: ignore[no-untyped-def]
+    def _live_question(survey_key: str):  # type: ignore[no-untyped-def]
+        """Resolve (spec, question) shown on the viewer: latest started -> first choice."""
         try:
             spec = load_survey(survey_key)
         except Exception:
-            return JSONResponse({"labels": [], "counts": []})
-        # choose question: latest state -> first
+            return None, None
         question = None
         with get_session() as session:
             state = (
@@ -893,15 +1139,18 @@ def create_app() -> FastAPI:
         if not question:
             question = next((qq for qq in spec.questions if qq.type == "choice"), None)
         if not question or not question.choices:
-            return JSONResponse({"labels": [], "counts": []})
-        with get_session() as session:
-            votes = session.query(LivePollVote).filter(
-                (LivePollVote.survey_key == survey_key) & (LivePollVote.question_id == question.id)
-            ).all()
-        from collections import Counter
-        counts = Counter([v.value for v in votes])
+            return spec, None
+        return spec, question
+
+    def _live_counts(survey_key: str, question) -> list[int]:  # type: ignore[no-untyped-def]
+        counts = live_tallies.counts(survey_key, question.id)
+        return [counts.get(c.value, 0) for c in (question.choices or [])]
+
+    def _live_payload(survey_key: str, spec, question) -> dict[str, object]:  # type: ignore[no-untyped-def]
+        if not spec or not question:
+            return {"labels": [], "counts": []}
         labels = [c.label for c in (question.choices or [])]
-        series = [counts.get(c.value, 0) for c in (question.choices or [])]
+        series = _live_counts(survey_key, question)
         # Colors per choice if provided in JSON; fallback by value/common names
         def _fallback_color(val: str, idx: int) -> str:
             m = {
@@ -915,14 +1164,97 @@ def create_app() -> FastAPI:
         # Choose image: prefer question.image_url, else survey.image_url
         q_image = getattr(question, "image_url", None)
         image_url = q_image or getattr(spec, "image_url", None)
-        return JSONResponse({
+        return {
             "labels": labels,
             "counts": series,
             "colors": colors,
             "title": spec.title,
             "prompt": question.prompt,
+            "question_id": question.id,
             "image_url": image_url or "",
-        })
+        }
+
+    @app.get("/live/api/survey/{survey_key}", response_class=JSONResponse)
+    def live_api(survey_key: str):  # type: ignore[no-untyped-def]
+        spec, question = _live_question(survey_key)
+        return JSONResponse(_live_payload(survey_key, spec, question))
+
+    def _sse_frame(event: str, data: dict[str, object]) -> str:
+        import json
+
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    async def _wait_for_votes(wake, timeout: float) -> bool:  # type: ignore[no-untyped-def]
+        """True when ``wake`` fired, False after ``timeout`` seconds without votes."""
+        import asyncio
+
+        try:
+            await asyncio.wait_for(wake.wait(), timeout=timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    async def _live_frames(survey_key: str, request: Request, wake, min_interval: float):  # type: ignore[no-untyped-def]
+        """``init`` with the full payload, then coalesced ``counts`` frames and keep-alives."""
+        import asyncio
+        from starlette.concurrency import run_in_threadpool
+
+        loop = asyncio.get_running_loop()
+        version = live_tallies.question_version(survey_key)
+        spec, question = await run_in_threadpool(_live_question, survey_key)
+        payload = _live_payload(survey_key, spec, question)
+        last_counts = payload["counts"]
+        yield _sse_frame("init", payload)
+        last_sent = loop.time()
+        while True:
+            if not await _wait_for_votes(wake, 15.0):
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            delay = last_sent + min_interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            wake.clear()
+            if await request.is_disconnected():
+                return
+            current_version = live_tallies.question_version(survey_key)
+            if current_version != version:
+                version = current_version
+                spec, question = await run_in_threadpool(_live_question, survey_key)
+                payload = _live_payload(survey_key, spec, question)
+                last_counts = payload["counts"]
+                yield _sse_frame("init", payload)
+            elif question is not None:
+                counts = _live_counts(survey_key, question)
+                if counts == last_counts:
+                    continue
+                last_counts = counts
+                yield _sse_frame("counts", {"counts": counts})
+            last_sent = loop.time()
+
+    @app.get("/live/stream/survey/{survey_key}")
+    async def live_stream(survey_key: str, request: Request):  # type: ignore[no-untyped-def]
+        """Server-sent events: ``init`` with the full payload, then ``counts`` frames.
+
+        Vote bursts are coalesced to at most LIVE_MAX_FPS frames per second and
+        nothing is sent while counts do not change (except a keep-alive comment).
+        """
+        min_interval = 1.0 / max(Settings().live_max_fps, 0.1)
+
+        async def _events():  # type: ignore[no-untyped-def]
+            wake = live_tallies.subscribe(survey_key)
+            try:
+                async for frame in _live_frames(survey_key, request, wake, min_interval):
+                    yield frame
+            finally:
+                live_tallies.unsubscribe(survey_key, wake)
+
+        return StreamingResponse(
+            _events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
     @app.get("/admin/vtuber", response_class=HTMLResponse)
     def vtuber_form(_: Auth) -> str:  # type: ignore[no-untyped-def]
@@ -939,6 +1271,7 @@ def create_app() -> FastAPI:
               input[type=text], textarea {{ width: 100%; padding: 6px; }}
               small {{ color: #666; }}
               nav a {{ margin-right: 12px; }}
+              .muted {{ color: #666; }}
             </style>
           </head>
           <body>
@@ -1013,16 +1346,58 @@ def create_app() -> FastAPI:
               </label>
               <button type='submit'>POST /v1/control/respond</button>
             </form>
+
+            <h2>Fan-out (несколько сессий)</h2>
+            <form method='post' action='/admin/vtuber/fanout'>
+              <label>command:
+                <select name='command'>
+                  <option value='speak'>speak</option>
+                  <option value='respond'>respond</option>
+                  <option value='system'>system</option>
+                </select>
+              </label>
+              <label>text (required):
+                <textarea name='text' rows='3'></textarea>
+              </label>
+              <label>client_uids (через пробел, запятую или с новой строки; пусто — все сессии из /v1/sessions):
+                <textarea name='client_uids' rows='2'></textarea>
+              </label>
+              <label>mode (для system):
+                <input type='text' name='mode' value='append' />
+              </label>
+              <label>параллельно: <input type='number' name='concurrency' min='1' value='{settings.vtuber_fanout_concurrency}' style='width:80px' />
+                &nbsp; таймаут на сессию (с ожиданием в очереди), с: <input type='number' name='timeout' min='1' step='0.5' value='{settings.vtuber_fanout_timeout:g}' style='width:80px' />
+              </label>
+              <button type='submit'>Send to sessions</button>
+            </form>
+
+            <h2>Очередь команд</h2>
+            <p class='muted'>Команды отправляются по очереди для каждой сессии: speak раньше respond, respond раньше system;
+              подряд идущие system append склеиваются в один запрос.</p>
+            <pre id='queue'>…</pre>
+            <script>
+              (async function poll() {{
+                try {{
+                  const r = await fetch('/admin/vtuber/commands?limit=10');
+                  const data = await r.json();
+                  const lines = data.commands.map(c =>
+                    `#${{c.id}} ${{c.kind}} ${{c.status}}` + (c.merged_into ? ` → #${{c.merged_into}}` : '')
+                    + (c.client_uid ? ` [${{c.client_uid}}]` : '')
+                    + (c.run_ms != null ? ` ${{c.run_ms}}ms` : '') + (c.error ? ` — ${{c.error}}` : ''));
+                  document.getElementById('queue').textContent =
+                    `в очереди: ${{data.queue.depth}}\\n` + (lines.join('\\n') || '—');
+                }} catch (e) {{}}
+                setTimeout(poll, 1000);
+              }})();
+            </script>
           </body>
         </html>
         """
 
     @app.post("/admin/vtuber/sessions", response_class=HTMLResponse)
     async def vtuber_sessions(_: Auth) -> str:  # type: ignore[no-untyped-def]
-        api_root = Settings().vtuber_api_root
-        client = VtuberClient(api_root)
         try:
-            sessions = await client.list_sessions()
+            sessions = await vtuber_client.list_sessions()
             items = "".join(f"<li><code>{s}</code></li>" for s in sessions) or "<li>—</li>"
             result_html = f"<ul>{items}</ul>"
         except Exception as e:  # noqa: BLE001
@@ -1041,131 +1416,144 @@ def create_app() -> FastAPI:
         </html>
         """
 
-    @app.post("/admin/vtuber/speak", response_class=HTMLResponse)
-    async def vtuber_speak(request: Request, _: Auth) -> str:  # type: ignore[no-untyped-def]
-        form = await request.form()
-        api_root = Settings().vtuber_api_root
-        text = str(form.get("text") or "").strip()
-        client_uid = str(form.get("client_uid") or "").strip() or None
-        apply_to_all = form.get("apply_to_all") is not None
-        if not text:
-            result_html = "<pre style='color:#b00;'>Error: text is required</pre>"
-        else:
-            client = VtuberClient(api_root)
-            try:
-                resp = await client.speak(text=text, client_uid=client_uid, apply_to_all=apply_to_all)
-                import json
-
-                result_html = (
-                    f"<p>API root: <code>{api_root}</code></p>"
-                    f"<pre>{json.dumps(resp, ensure_ascii=False, indent=2)}</pre>"
-                )
-            except Exception as e:  # noqa: BLE001
-                result_html = (
-                    f"<p>API root: <code>{api_root}</code></p>"
-                    f"<pre style='color:#b00;'>Error: {e!s}</pre>"
-                )
+    def _queued_page(title: str, form_error: Optional[str], cmd: Optional[VtuberCommand]) -> str:
+        """Result page of a queued VTuber command; polls the command status."""
+        from html import escape
 
+        if form_error or cmd is None:
+            body = f"<pre style='color:#b00;'>Error: {escape(form_error or '')}</pre>"
+            script = ""
+        else:
+            # a merged system append is sent as part of an earlier command
+            target = cmd.merged_into or cmd.id
+            body = (
+                f"<p>API root: <code>{escape(vtuber_client.base_url)}</code></p>"
+                f"<p>Command #{cmd.id} queued"
+                + (f" (merged into #{target})" if cmd.merged_into else "")
+                + "</p><pre id='status'>…</pre>"
+            )
+            script = f"""
+            <script>
+              (async function poll() {{
+                const r = await fetch('/admin/vtuber/commands/{target}');
+                const cmd = await r.json();
+                document.getElementById('status').textContent = JSON.stringify(cmd, null, 2);
+                if (cmd.status === 'queued' || cmd.status === 'running') setTimeout(poll, 500);
+              }})();
+            </script>"""
         return f"""
         <html>
           <head>
             <meta charset='utf-8' />
-            <title>Speak — VTuber</title>
+            <title>{title} — VTuber</title>
           </head>
           <body>
             <p><a href='/admin/vtuber'>&larr; Back</a></p>
-            <h1>Speak Result</h1>
-            {result_html}
+            <h1>{title} Result</h1>
+            {body}
+            {script}
           </body>
         </html>
         """
 
-    @app.post("/admin/vtuber/system", response_class=HTMLResponse)
-    async def vtuber_system(request: Request, _: Auth) -> str:  # type: ignore[no-untyped-def]
+    async def _submit_command(request: Request, kind: str) -> tuple[Optional[str], Optional[VtuberCommand]]:
         form = await request.form()
-        api_root = Settings().vtuber_api_root
         text = str(form.get("text") or "").strip()
-        client_uid = str(form.get("client_uid") or "").strip() or None
-        mode = str(form.get("mode") or "append").strip() or "append"
-        apply_to_all = form.get("apply_to_all") is not None
         if not text:
-            result_html = "<pre style='color:#b00;'>Error: text is required</pre>"
-        else:
-            client = VtuberClient(api_root)
-            try:
-                resp = await client.system_instruction(
-                    text=text,
-                    client_uid=client_uid,
-                    mode=mode,
-                    apply_to_all=apply_to_all,
-                )
-                import json
+            return "text is required", None
+        cmd = vtuber_queue.submit(
+            kind,
+            text,
+            client_uid=str(form.get("client_uid") or "").strip() or None,
+            apply_to_all=form.get("apply_to_all") is not None,
+            mode=str(form.get("mode") or "append").strip() or "append",
+        )
+        return None, cmd
 
-                result_html = (
-                    f"<p>API root: <code>{api_root}</code></p>"
-                    f"<pre>{json.dumps(resp, ensure_ascii=False, indent=2)}</pre>"
-                )
-            except Exception as e:  # noqa: BLE001
-                result_html = (
-                    f"<p>API root: <code>{api_root}</code></p>"
-                    f"<pre style='color:#b00;'>Error: {e!s}</pre>"
-                )
-        return f"""
-        <html>
-          <head>
-            <meta charset='utf-8' />
-            <title>System — VTuber</title>
-          </head>
-          <body>
-            <p><a href='/admin/vtuber'>&larr; Back</a></p>
-            <h1>System Result</h1>
-            {result_html}
-          </body>
-        </html>
-        """
+    @app.post("/admin/vtuber/speak", response_class=HTMLResponse)
+    async def vtuber_speak(request: Request, _: Auth) -> str:  # type: ignore[no-untyped-def]
+        return _queued_page("Speak", *await _submit_command(request, "speak"))
+
+    @app.post("/admin/vtuber/system", response_class=HTMLResponse)
+    async def vtuber_system(request: Request, _: Auth) -> str:  # type: ignore[no-untyped-def]
+        return _queued_page("System", *await _submit_command(request, "system"))
 
     @app.post("/admin/vtuber/respond", response_class=HTMLResponse)
     async def vtuber_respond(request: Request, _: Auth) -> str:  # type: ignore[no-untyped-def]
+        return _queued_page("Respond", *await _submit_command(request, "respond"))
+
+    @app.post("/admin/vtuber/fanout", response_class=HTMLResponse)
+    async def vtuber_fanout(request: Request, _: Auth) -> str:  # type: ignore[no-untyped-def]
+        import json
+        import re
+        from html import escape
+
+        settings = Settings()
         form = await request.form()
-        api_root = Settings().vtuber_api_root
+        command = str(form.get("command") or "speak")
         text = str(form.get("text") or "").strip()
-        client_uid = str(form.get("client_uid") or "").strip() or None
-        apply_to_all = form.get("apply_to_all") is not None
+        uids = [u for u in re.split(r"[\s,]+", str(form.get("client_uids") or "")) if u]
+
+        def _number(name: str, default: float) -> float:
+            try:
+                return max(float(str(form.get(name) or default)), 0.1)
+            except ValueError:
+                return default
+
         if not text:
             result_html = "<pre style='color:#b00;'>Error: text is required</pre>"
         else:
-            client = VtuberClient(api_root)
             try:
-                resp = await client.respond(
-                    text=text,
-                    client_uid=client_uid,
-                    apply_to_all=apply_to_all,
+                # through the queue: ordered with other commands of each session and with broadcasts
+                report = await vtuber_queue.fan_out(
+                    command,
+                    text,
+                    client_uids=uids or None,
+                    mode=str(form.get("mode") or "append").strip() or "append",
+                    concurrency=int(_number("concurrency", settings.vtuber_fanout_concurrency)),
+                    timeout=_number("timeout", settings.vtuber_fanout_timeout),
                 )
-                import json
-
+                rows = "".join(
+                    f"<tr><td><code>{escape(r.client_uid)}</code></td>"
+                    f"<td>{'✓' if r.ok else '…' if r.pending else '✗'}</td><td style='text-align:right;'>{r.latency_ms:.0f}</td>"
+                    f"<td><pre>{escape(json.dumps(r.result, ensure_ascii=False) if r.ok else (r.error or ''))}</pre></td></tr>"
+                    for r in report.results
+                ) or "<tr><td colspan='4'>Нет сессий</td></tr>"
                 result_html = (
-                    f"<p>API root: <code>{api_root}</code></p>"
-                    f"<pre>{json.dumps(resp, ensure_ascii=False, indent=2)}</pre>"
+                    f"<p>{escape(command)} → {len(report.results)} sessions: ok {report.ok}, failed {report.failed}, pending {report.pending},"
+                    f" {report.elapsed * 1000:.0f} ms total</p>"
+                    "<table border='1' cellpadding='6' style='border-collapse:collapse;'>"
+                    "<thead><tr><th>client_uid</th><th>ok</th><th>ms</th><th>result / error</th></tr></thead>"
+                    f"<tbody>{rows}</tbody></table>"
                 )
             except Exception as e:  # noqa: BLE001
-                result_html = (
-                    f"<p>API root: <code>{api_root}</code></p>"
-                    f"<pre style='color:#b00;'>Error: {e!s}</pre>"
-                )
+                result_html = f"<pre style='color:#b00;'>Error: {escape(str(e))}</pre>"
         return f"""
         <html>
           <head>
             <meta charset='utf-8' />
-            <title>Respond — VTuber</title>
+            <title>Fan-out — VTuber</title>
           </head>
           <body>
             <p><a href='/admin/vtuber'>&larr; Back</a></p>
-            <h1>Respond Result</h1>
+            <h1>Fan-out Result</h1>
+            <p>API root: <code>{escape(vtuber_client.base_url)}</code></p>
             {result_html}
           </body>
         </html>
         """
 
+    @app.get("/admin/vtuber/commands")
+    async def vtuber_commands(_: Auth, limit: int = Query(20, ge=1, le=200)) -> dict[str, object]:  # type: ignore[no-untyped-def]
+        return {"queue": vtuber_queue.stats(), "commands": [c.as_dict() for c in vtuber_queue.recent(limit)]}
+
+    @app.get("/admin/vtuber/commands/{command_id}")
+    async def vtuber_command(command_id: int, _: Auth) -> dict[str, object]:  # type: ignore[no-untyped-def]
+        cmd = vtuber_queue.get(command_id)
+        if cmd is None:
+            raise HTTPException(status_code=404, detail="Command not found")
+        return cmd.as_dict()
+
     return app
 
 
@@ -1177,6 +1565,8 @@ async def run_admin() -> None:
         host=settings.admin_host,
         port=settings.admin_port,
         log_level="info",
+        # live viewers keep SSE streams open; do not wait for them forever on shutdown
+        timeout_graceful_shutdown=5,
     )
     server = uvicorn.Server(config)
     await server.serve()
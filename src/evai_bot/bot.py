@@ -1,23 +1,96 @@
 from __future__ import annotations
 
-from aiogram import Bot, Dispatcher, F, Router
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from aiogram import BaseMiddleware, Bot, Dispatcher, F, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
 from aiogram.filters import Command, CommandStart
-from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
+from aiogram.methods import Response, TelegramMethod
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message, TelegramObject
 
 from .config import Settings
-from .db import get_session, init_db
-from .models import SurveyRun, User, LivePollVote
+from .db import init_db
+from .live import live_tallies, vote_buffer
+from .metrics import BOT_HANDLER_ERRORS, BOT_HANDLER_SECONDS, QUERIES_PER_UNIT, track_outbound
+from .query_tracker import track_queries
+from .models import SurveyRun
+from .telegram_sender import TELEGRAM_API_BASE
+from .user_cache import user_cache
 from .surveys.engine import (
-    complete_run,
+    acomplete_run,
+    active_runs,
+    aresolve_user_id,
+    arecord_answer_and_advance,
+    astart_survey_run,
     get_current_question,
-    get_or_create_user,
     load_survey,
-    record_answer_and_advance,
-    start_survey_run,
 )
 
 
+logger = logging.getLogger(__name__)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Records latency and exceptions of every handler of the router."""
+
+    def __init__(self, event: str) -> None:
+        self.event = event
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            BOT_HANDLER_ERRORS.inc(event=self.event, handler=name)
+            raise
+        finally:
+            BOT_HANDLER_SECONDS.observe(time.perf_counter() - started, event=self.event, handler=name)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Records latency and errors of the bot's own Bot API calls."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[Any],
+        bot: Bot,
+        method: TelegramMethod[Any],
+    ) -> Response[Any]:
+        with track_outbound("telegram", method.__api_method__):
+            return await make_request(bot, method)
+
+
+class QueryTrackingMiddleware(BaseMiddleware):
+    """Counts SQL statements per update (see ``query_tracker``)."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        label = f"update {event.event_type}" if hasattr(event, "event_type") else "update"
+        with track_queries(label) as stats:
+            result = await handler(event, data)
+        QUERIES_PER_UNIT.observe(stats.count, kind="bot")
+        return result
+
+
 router = Router()
+router.message.middleware(HandlerMetricsMiddleware("message"))
+router.callback_query.middleware(HandlerMetricsMiddleware("callback_query"))
 
 
 @router.message(CommandStart())
@@ -27,7 +100,7 @@ async def handle_start(message: Message) -> None:
         return
     if getattr(tg_user, "is_bot", False):
         return
-    _ = get_or_create_user(
+    _ = await aresolve_user_id(
         tg_id=tg_user.id,
         username=tg_user.username,
         first_name=tg_user.first_name,
@@ -71,34 +144,28 @@ async def start_survey_flow(message: Message, *, survey_key: str, tg_user_overri
         return
     if getattr(tg_user, "is_bot", False):
         return
-    user = get_or_create_user(
+    user_id = await aresolve_user_id(
         tg_id=tg_user.id,
         username=tg_user.username,
         first_name=tg_user.first_name,
         last_name=tg_user.last_name,
     )
     spec = load_survey(survey_key)
-    run = start_survey_run(user_id=user.id or 0, survey_key=spec.key)
+    run = await astart_survey_run(user_id=user_id, survey_key=spec.key)
     await present_current_question(message, run, spec)
 
 
 async def present_current_question(message_or_cb: Message | CallbackQuery, run: SurveyRun, spec):
     q = get_current_question(run, spec)
     if not q:
-        complete_run(run.id or 0)
+        # Mark user as registered in the same transaction
+        await acomplete_run(run.id or 0, mark_registered=True)
         text = "Готово! Регистрация завершена."
         if isinstance(message_or_cb, CallbackQuery):
             await message_or_cb.message.edit_text(text)
             await message_or_cb.answer()
         else:
             await message_or_cb.answer(text)
-        # Mark user as registered (best-effort)
-        with get_session() as session:
-            u = session.get(User, run.user_id)
-            if u:
-                u.is_registered = True
-                session.add(u)
-                session.commit()
         return
     # Determine optional image for this question/survey
     image_url = getattr(q, "image_url", None)
@@ -167,7 +234,7 @@ async def cb_choice_answer(cb: CallbackQuery) -> None:
         await cb.answer("Некорректные данные кнопки", show_alert=True)
         return
     # Persist and advance
-    run = record_answer_and_advance(run_id, question_id, choice=value)
+    run = await arecord_answer_and_advance(run_id, question_id, choice=value)
     spec = load_survey(run.survey_key)
     await present_current_question(cb, run, spec)
 
@@ -183,28 +250,14 @@ async def cb_livepoll(cb: CallbackQuery) -> None:
     if not tg_user:
         await cb.answer()
         return
-    user = get_or_create_user(
+    user_id = await aresolve_user_id(
         tg_id=tg_user.id,
         username=tg_user.username,
         first_name=tg_user.first_name,
         last_name=tg_user.last_name,
     )
-    from sqlmodel import select
-    with get_session() as session:
-        existing = session.exec(
-            select(LivePollVote).where(
-                (LivePollVote.user_id == (user.id or 0))
-                & (LivePollVote.survey_key == survey_key)
-                & (LivePollVote.question_id == question_id)
-            )
-        ).first()
-        if existing:
-            existing.value = value
-            session.add(existing)
-        else:
-            v = LivePollVote(user_id=user.id or 0, survey_key=survey_key, question_id=question_id, value=value)
-            session.add(v)
-        session.commit()
+    # Tallies update immediately; the DB write is batched by the buffer
+    vote_buffer.add(user_id, survey_key, question_id, value)
     await cb.answer("Голос учтён")
 
 
@@ -213,36 +266,115 @@ async def on_any_message(message: Message) -> None:
     tg_user = message.from_user
     if not tg_user or getattr(tg_user, "is_bot", False) or not message.text:
         return
-    # Find active run for this user
-    from sqlmodel import select
-
-    with get_session() as session:
-        user = session.exec(select(User).where(User.tg_id == tg_user.id)).first()
-        if not user:
-            return
-        run = session.exec(
-            select(SurveyRun).where(
-                (SurveyRun.completed_at.is_(None)) & (SurveyRun.user_id == user.id)
-            )
-        ).first()
-        if not run:
-            return
-        spec = load_survey(run.survey_key)
-        q = get_current_question(run, spec)
-        if not q or q.type != "text":
-            return
+    # Find active run for this user (in memory, no DB access)
+    active = active_runs.get(tg_user.id)
+    if not active:
+        return
+    spec = load_survey(active.survey_key)
+    q = get_current_question(active, spec)
+    if not q or q.type != "text":
+        return
     # Record answer and present next
-    run = record_answer_and_advance(run.id or 0, q.id, text=message.text.strip())
+    run = await arecord_answer_and_advance(active.run_id, q.id, text=message.text.strip())
     spec = load_survey(run.survey_key)
     await present_current_question(message, run, spec)
 
 
+def create_bot(settings: Settings) -> Bot:
+    """Bot client; ``TELEGRAM_API_BASE`` points it at another Bot API server."""
+    base = settings.telegram_api_base.rstrip("/")
+    api = PRODUCTION if base == TELEGRAM_API_BASE else TelegramAPIServer.from_base(base)
+    session = AiohttpSession(api=api)
+    session.middleware(ApiMetricsMiddleware())
+    return Bot(token=settings.bot_token, session=session)
+
+
+def create_dispatcher() -> Dispatcher:
+    dp = Dispatcher()
+    dp.update.outer_middleware(QueryTrackingMiddleware())
+    dp.include_router(router)
+    return dp
+
+
+class WebhookReceiver:
+    """Feeds updates posted to the admin app into the bot's dispatcher.
+
+    ``run_bot`` attaches the bot and dispatcher in webhook mode; until then
+    (or after ``stop``) updates are refused so Telegram redelivers them.
+    Updates are processed in background tasks so the webhook answers at once.
+    """
+
+    def __init__(self) -> None:
+        self.bot: Optional[Bot] = None
+        self.dp: Optional[Dispatcher] = None
+        self._tasks: Set[asyncio.Task[Any]] = set()
+        self._stopped = asyncio.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self.bot is not None and self.dp is not None
+
+    def attach(self, bot: Bot, dp: Dispatcher) -> None:
+        self.bot, self.dp = bot, dp
+
+    def feed(self, update: Dict[str, Any]) -> bool:
+        """Schedule processing of one raw update; False if the bot is not attached."""
+        if self.bot is None or self.dp is None:
+            return False
+        task = asyncio.get_running_loop().create_task(self.dp.feed_raw_update(self.bot, update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    def stop(self) -> None:
+        """Ask ``run_bot`` to leave webhook mode (called on admin shutdown)."""
+        self._stopped.set()
+
+    async def wait_stopped(self) -> None:
+        await self._stopped.wait()
+
+    async def detach(self) -> None:
+        self.bot, self.dp = None, None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+webhook_receiver = WebhookReceiver()
+
+
+async def _run_webhook(bot: Bot, dp: Dispatcher, settings: Settings) -> None:
+    url = settings.webhook_url.rstrip("/") + settings.webhook_path
+    webhook_receiver.attach(bot, dp)
+    try:
+        await bot.set_webhook(
+            url,
+            secret_token=settings.webhook_secret,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info("Webhook set to %s", url)
+        await webhook_receiver.wait_stopped()
+    finally:
+        await webhook_receiver.detach()
+        await bot.session.close()
+
+
 async def run_bot() -> None:
     settings = Settings()
     init_db()
+    live_tallies.ensure_loaded()
+    active_runs.ensure_loaded()
 
-    bot = Bot(token=settings.bot_token)
-    dp = Dispatcher()
-    dp.include_router(router)
+    bot = create_bot(settings)
+    dp = create_dispatcher()
 
-    await dp.start_polling(bot)
+    vote_buffer.start()
+    user_cache.start()
+    try:
+        if settings.webhook_url:
+            await _run_webhook(bot, dp, settings)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        await vote_buffer.stop()
+        await user_cache.stop()
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from pydantic import Field
+import re
+
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,11 +10,70 @@ class Settings(BaseSettings):
     """Application runtime settings loaded from environment/.env."""
 
     bot_token: str = Field(alias="BOT_TOKEN")
+    # Bot API server; point at a local Bot API server or a fake one for tests
+    telegram_api_base: str = Field(default="https://api.telegram.org", alias="TELEGRAM_API_BASE")
+    # Webhook mode: public base URL of the admin server; empty = long polling.
+    # WEBHOOK_SECRET is then required (1-256 chars of A-Z a-z 0-9 _ -): Telegram
+    # sends it with every update and the admin rejects posts without it
+    webhook_url: str = Field(default="", alias="WEBHOOK_URL")
+    webhook_path: str = Field(default="/telegram/webhook", alias="WEBHOOK_PATH")
+    webhook_secret: str = Field(default="", alias="WEBHOOK_SECRET")
     database_url: str = Field(default="sqlite:///./data.db", alias="DATABASE_URL")
+    # Threads used by the bot to run blocking DB calls off the event loop
+    db_workers: int = Field(default=4, alias="DB_WORKERS")
+    # Connection pool (ignored for in-memory SQLite)
+    db_pool_size: int = Field(default=10, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(default=20, alias="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(default=30.0, alias="DB_POOL_TIMEOUT")
+    # SQLite PRAGMAs applied on every new connection; empty value = SQLite default
+    sqlite_journal_mode: str = Field(default="WAL", alias="SQLITE_JOURNAL_MODE")
+    sqlite_synchronous: str = Field(default="NORMAL", alias="SQLITE_SYNCHRONOUS")
+    sqlite_busy_timeout_ms: str = Field(default="5000", alias="SQLITE_BUSY_TIMEOUT_MS")
+    sqlite_mmap_size: str = Field(default="268435456", alias="SQLITE_MMAP_SIZE")
+    sqlite_cache_size: str = Field(default="-65536", alias="SQLITE_CACHE_SIZE")  # negative = KiB
+    sqlite_temp_store: str = Field(default="MEMORY", alias="SQLITE_TEMP_STORE")
+    # How often (seconds) cached survey files are checked for changes on disk
+    survey_reload_interval: float = Field(default=2.0, alias="SURVEY_RELOAD_INTERVAL")
+    # Max frames per second pushed to each live viewer (votes are coalesced)
+    live_max_fps: float = Field(default=4.0, alias="LIVE_MAX_FPS")
+    # Live poll votes are buffered and written in batches every N ms or M votes
+    vote_flush_ms: int = Field(default=200, alias="VOTE_FLUSH_MS")
+    vote_flush_max: int = Field(default=500, alias="VOTE_FLUSH_MAX")
+    # tg_id -> user id LRU for the bot; changed profile fields are written back in batches
+    user_cache_size: int = Field(default=10000, alias="USER_CACHE_SIZE")
+    user_flush_interval: float = Field(default=5.0, alias="USER_FLUSH_INTERVAL")
+    # Per-request SQL accounting: warn when one statement shape repeats more than N
+    # times (likely N+1), and when more than QUERY_BUDGET statements run (0 = off);
+    # QUERY_BUDGET_STRICT=1 raises instead (for tests)
+    query_repeat_warn: int = Field(default=10, alias="QUERY_REPEAT_WARN")
+    query_budget: int = Field(default=0, alias="QUERY_BUDGET")
+    query_budget_strict: bool = Field(default=False, alias="QUERY_BUDGET_STRICT")
     admin_host: str = Field(default="127.0.0.1", alias="ADMIN_HOST")
     admin_port: int = Field(default=8080, alias="ADMIN_PORT")
     admin_token: str = Field(default="", alias="ADMIN_TOKEN")
+    # Outgoing Telegram sends (broadcasts): global rate, per-chat spacing, parallelism
+    tg_rate_limit: float = Field(default=30.0, alias="TG_RATE_LIMIT")
+    tg_per_chat_interval: float = Field(default=1.0, alias="TG_PER_CHAT_INTERVAL")
+    tg_send_concurrency: int = Field(default=16, alias="TG_SEND_CONCURRENCY")
+    tg_send_retries: int = Field(default=3, alias="TG_SEND_RETRIES")
     vtuber_api_root: str = Field(default="http://127.0.0.1:7860", alias="VTUBER_API_ROOT")
+    # Pooled HTTP client for the VTuber API: response/connect timeouts (s),
+    # max parallel connections, and how long an idle keep-alive connection is kept
+    vtuber_timeout: float = Field(default=20.0, alias="VTUBER_TIMEOUT")
+    vtuber_connect_timeout: float = Field(default=5.0, alias="VTUBER_CONNECT_TIMEOUT")
+    vtuber_max_connections: int = Field(default=10, alias="VTUBER_MAX_CONNECTIONS")
+    vtuber_keepalive_expiry: float = Field(default=30.0, alias="VTUBER_KEEPALIVE_EXPIRY")
+    # Fan-out of one command to many sessions: parallel requests, per-session timeout (s)
+    vtuber_fanout_concurrency: int = Field(default=8, alias="VTUBER_FANOUT_CONCURRENCY")
+    vtuber_fanout_timeout: float = Field(default=10.0, alias="VTUBER_FANOUT_TIMEOUT")
+
+    @model_validator(mode="after")
+    def _check_webhook_secret(self) -> "Settings":
+        if self.webhook_url and not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", self.webhook_secret):
+            raise ValueError(
+                "WEBHOOK_SECRET (1-256 characters A-Z, a-z, 0-9, _ or -) is required when WEBHOOK_URL is set"
+            )
+        return self
 
     model_config = SettingsConfigDict(
         env_file=".env",
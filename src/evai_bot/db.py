@@ -1,20 +1,152 @@
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Iterator
+from typing import Any, Callable, Iterator, TypeVar
 
+from sqlalchemy import Connection, Engine, event, inspect, make_url, text
+from sqlalchemy.schema import CreateIndex
 from sqlmodel import SQLModel, Session, create_engine
 
 from .config import Settings
+from .metrics import SQL_SECONDS
+from .query_tracker import record_statement
+
+
+T = TypeVar("T")
+
+
+def sqlite_pragmas(settings: Settings) -> list[tuple[str, str]]:
+    """Performance profile for SQLite; settings left empty are not applied."""
+    pragmas = [
+        ("journal_mode", settings.sqlite_journal_mode),
+        ("synchronous", settings.sqlite_synchronous),
+        ("busy_timeout", settings.sqlite_busy_timeout_ms),
+        ("mmap_size", settings.sqlite_mmap_size),
+        ("cache_size", settings.sqlite_cache_size),
+        ("temp_store", settings.sqlite_temp_store),
+    ]
+    return [(name, value.strip()) for name, value in pragmas if value.strip()]
+
+
+def build_engine(settings: Settings) -> Engine:
+    url = make_url(settings.database_url)
+    kwargs: dict[str, Any] = {"echo": False}
+    in_memory = url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+    if not in_memory:
+        kwargs.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+        )
+    eng = create_engine(url, **kwargs)
+    _instrument(eng)
+    if url.get_backend_name() == "sqlite":
+        pragmas = sqlite_pragmas(settings)
+
+        @event.listens_for(eng, "connect")
+        def _apply_pragmas(dbapi_conn: Any, _record: Any) -> None:
+            cursor = dbapi_conn.cursor()
+            try:
+                for name, value in pragmas:
+                    cursor.execute(f"PRAGMA {name}={value}")
+            finally:
+                cursor.close()
+
+    return eng
+
+
+def _instrument(eng: Engine) -> None:
+    """Record every statement in the SQL metrics and the per-request tracker."""
+
+    # the start time lives on the per-statement context, so a statement that
+    # raises (no after_cursor_execute) leaves nothing behind
+    @event.listens_for(eng, "before_cursor_execute")
+    def _before(conn: Connection, cursor: Any, statement: str, params: Any, context: Any, executemany: bool) -> None:
+        if context is not None:
+            context._evai_started = time.perf_counter()
+
+    @event.listens_for(eng, "after_cursor_execute")
+    def _after(conn: Connection, cursor: Any, statement: str, params: Any, context: Any, executemany: bool) -> None:
+        started = getattr(context, "_evai_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        SQL_SECONDS.observe(elapsed, operation=operation)
+        record_statement(statement, elapsed)
 
 
 _settings = Settings()
-engine = create_engine(_settings.database_url, echo=False)
+engine = build_engine(_settings)
+
+# SQLite serialises writers anyway, so a small dedicated pool keeps blocking
+# DB work off the event loop without competing with uvicorn's threadpool.
+_db_executor = ThreadPoolExecutor(
+    max_workers=max(1, _settings.db_workers),
+    thread_name_prefix="evai-db",
+)
 
 
 def init_db() -> None:
-    """Create tables if they do not exist."""
+    """Create tables if they do not exist and migrate older databases."""
+    with engine.connect() as conn:
+        existing = set(inspect(conn).get_table_names())
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        _migrate(conn, existing)
+
+
+def _migrate(conn: Connection, tables: set[str]) -> None:
+    """Idempotent schema fixes for databases created by older versions.
+
+    ``tables`` are the tables that existed before ``create_all``.
+    """
+    insp = inspect(conn)
+    if "livepollvote" in tables:
+        indexes = {ix["name"] for ix in insp.get_indexes("livepollvote")}
+        if "ux_livepollvote_user_question" not in indexes:
+            # Older versions could store duplicate votes; keep the newest one
+            # so the unique index below can be created
+            conn.execute(
+                text(
+                    "DELETE FROM livepollvote WHERE id NOT IN ("
+                    " SELECT MAX(id) FROM livepollvote GROUP BY user_id, survey_key, question_id)"
+                )
+            )
+    if "broadcastjob" in tables:
+        columns = {c["name"] for c in insp.get_columns("broadcastjob")}
+        if "resumed_at" not in columns:
+            conn.execute(text("ALTER TABLE broadcastjob ADD COLUMN resumed_at TIMESTAMP"))
+        if "resumed_done" not in columns:
+            conn.execute(text("ALTER TABLE broadcastjob ADD COLUMN resumed_done INTEGER NOT NULL DEFAULT 0"))
+    # create_all() skips existing tables, so indexes added later are created here
+    # (IF NOT EXISTS: expression indexes are not reflected by the inspector)
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        for index in table.indexes:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+    if "choicetally" not in tables and "surveyanswer" in tables:
+        # tally table added to a database that already has answers
+        from .surveys.tallies import rebuild_tallies
+
+        rebuild_tallies(conn)
+
+
+def dialect_insert(table: Any) -> Any:
+    """``INSERT`` construct with ``on_conflict_do_update`` for the current dialect."""
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        return pg_insert(table)
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+    return sqlite_insert(table)
 
 
 @contextmanager
@@ -22,3 +154,13 @@ def get_session() -> Iterator[Session]:
     with Session(engine) as session:
         yield session
 
+
+async def run_db(fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """Run a blocking DB function on the dedicated DB executor.
+
+    Context variables are propagated like ``asyncio.to_thread`` does.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, fn, *args, **kwargs)
+    return await loop.run_in_executor(_db_executor, call)
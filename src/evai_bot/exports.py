@@ -0,0 +1,152 @@
+"""Streaming exports of survey answers and live poll votes.
+
+Rows are read with ``yield_per`` (server-side iteration) and encoded in
+small chunks, so memory stays flat regardless of how much data there is.
+The generators are synchronous; Starlette iterates them in its threadpool.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlmodel import select
+
+from .db import get_session
+from .models import LivePollVote, SurveyAnswer, SurveyRun, User
+
+
+YIELD_PER = 1000
+ROWS_PER_CHUNK = 500
+
+USER_COLUMNS = ["user_id", "tg_id", "username", "first_name", "last_name"]
+ANSWER_COLUMNS = [
+    "answer_id",
+    "answered_at",
+    "survey_key",
+    "run_id",
+    "run_started_at",
+    "run_completed_at",
+    *USER_COLUMNS,
+    "question_id",
+    "answer_text",
+    "answer_choice",
+]
+VOTE_COLUMNS = ["vote_id", "voted_at", "survey_key", "question_id", "value", *USER_COLUMNS]
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored as naive UTC; convert aware filter values to match."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def iter_answers(
+    survey_key: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Iterator[List[Any]]:
+    """Answer rows (``ANSWER_COLUMNS`` order) joined with run and user, by answer id."""
+    stmt = (
+        select(
+            SurveyAnswer.id,
+            SurveyAnswer.created_at,
+            SurveyRun.survey_key,
+            SurveyRun.id,
+            SurveyRun.created_at,
+            SurveyRun.completed_at,
+            User.id,
+            User.tg_id,
+            User.username,
+            User.first_name,
+            User.last_name,
+            SurveyAnswer.question_id,
+            SurveyAnswer.answer_text,
+            SurveyAnswer.answer_choice,
+        )
+        .join(SurveyRun, SurveyRun.id == SurveyAnswer.run_id)
+        .join(User, User.id == SurveyRun.user_id)
+        .order_by(SurveyAnswer.id)
+        .execution_options(yield_per=YIELD_PER)
+    )
+    if survey_key:
+        stmt = stmt.where(SurveyRun.survey_key == survey_key)
+    if since:
+        stmt = stmt.where(SurveyAnswer.created_at >= _naive_utc(since))
+    if until:
+        stmt = stmt.where(SurveyAnswer.created_at < _naive_utc(until))
+    with get_session() as session:
+        for row in session.exec(stmt):
+            yield list(row)
+
+
+def iter_votes(
+    survey_key: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Iterator[List[Any]]:
+    """Live poll vote rows (``VOTE_COLUMNS`` order) joined with the user, by vote id."""
+    stmt = (
+        select(
+            LivePollVote.id,
+            LivePollVote.created_at,
+            LivePollVote.survey_key,
+            LivePollVote.question_id,
+            LivePollVote.value,
+            User.id,
+            User.tg_id,
+            User.username,
+            User.first_name,
+            User.last_name,
+        )
+        .join(User, User.id == LivePollVote.user_id)
+        .order_by(LivePollVote.id)
+        .execution_options(yield_per=YIELD_PER)
+    )
+    if survey_key:
+        stmt = stmt.where(LivePollVote.survey_key == survey_key)
+    if since:
+        stmt = stmt.where(LivePollVote.created_at >= _naive_utc(since))
+    if until:
+        stmt = stmt.where(LivePollVote.created_at < _naive_utc(until))
+    with get_session() as session:
+        for row in session.exec(stmt):
+            yield list(row)
+
+
+def _plain(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_csv(columns: List[str], rows: Iterable[List[Any]]) -> Iterator[str]:
+    """CSV with a header line, emitted in chunks of ``ROWS_PER_CHUNK`` rows."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow([_plain(v) for v in row])
+        pending += 1
+        if pending >= ROWS_PER_CHUNK:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    yield buf.getvalue()
+
+
+def encode_ndjson(columns: List[str], rows: Iterable[List[Any]]) -> Iterator[str]:
+    """One JSON object per line, emitted in chunks of ``ROWS_PER_CHUNK`` rows."""
+    lines: List[str] = []
+    for row in rows:
+        record: Dict[str, Any] = {c: _plain(v) for c, v in zip(columns, row, strict=True)}
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) >= ROWS_PER_CHUNK:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
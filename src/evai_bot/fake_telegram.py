@@ -0,0 +1,186 @@
+"""Local stand-in for the Telegram Bot API, for benchmarks and offline tests.
+
+Point the app at it with ``TELEGRAM_API_BASE=http://127.0.0.1:8081``. Sending
+methods answer like Telegram does; every request can be delayed by an
+injected latency, and requests over ``rate_limit`` per second are refused
+with HTTP 429 and ``retry_after`` like Telegram's flood control.
+
+Run standalone::
+
+    uv run python -m evai_bot.fake_telegram --port 8081 --latency-ms 50 --rate-limit 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class FakeTelegramStats:
+    requests: Counter[str] = field(default_factory=Counter)
+    throttled: int = 0
+    chats: Counter[int] = field(default_factory=Counter)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": dict(self.requests),
+            "total": sum(self.requests.values()),
+            "throttled": self.throttled,
+            "chats": len(self.chats),
+        }
+
+
+class FakeTelegram:
+    """Bot API behaviour: latency, a global per-second flood limit, canned results."""
+
+    def __init__(
+        self,
+        *,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        rate_limit: float = 0.0,
+        retry_after: int = 1,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit = rate_limit  # accepted requests per second; 0 = unlimited
+        self.retry_after = retry_after
+        self.stats = FakeTelegramStats()
+        self._message_ids = itertools.count(1)
+        self._window_start = 0.0
+        self._window_count = 0
+        self._blocked_until = 0.0
+
+    def _throttle(self) -> bool:
+        """True if this request must get a 429."""
+        if self.rate_limit <= 0:
+            return False
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return True
+        if now - self._window_start >= 1.0:
+            self._window_start, self._window_count = now, 0
+        self._window_count += 1
+        if self._window_count > self.rate_limit:
+            self._blocked_until = now + self.retry_after
+            return True
+        return False
+
+    async def handle(self, method: str, params: Dict[str, Any]) -> JSONResponse:
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+        self.stats.requests[method] += 1
+        if self._throttle():
+            self.stats.throttled += 1
+            return JSONResponse(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                },
+                status_code=429,
+            )
+        result = self._result(method, params)
+        if result is None:
+            return JSONResponse({"ok": False, "error_code": 404, "description": "Not Found"}, status_code=404)
+        return JSONResponse({"ok": True, "result": result})
+
+    def _result(self, method: str, params: Dict[str, Any]) -> Any:
+        name = method.lower()
+        if name == "getme":
+            return {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        if name in ("sendmessage", "sendphoto", "editmessagetext", "editmessagereplymarkup", "editmessagecaption"):
+            chat_id = _int(params.get("chat_id"))
+            self.stats.chats[chat_id] += 1
+            message: Dict[str, Any] = {
+                "message_id": _int(params.get("message_id")) or next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+            }
+            if "text" in params:
+                message["text"] = params["text"]
+            if "caption" in params:
+                message["caption"] = params["caption"]
+            return message
+        if name in ("answercallbackquery", "setwebhook", "deletewebhook", "deletemessage"):
+            return True
+        if name == "getupdates":
+            return []
+        return None
+
+
+def _int(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+async def _params(request: Request) -> Dict[str, Any]:
+    if request.method == "GET":
+        return dict(request.query_params)
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        body = await request.body()
+        return json.loads(body) if body else {}
+    form = await request.form()
+    return {k: v for k, v in form.items() if isinstance(v, str)}
+
+
+def create_fake_telegram_app(fake: FakeTelegram) -> FastAPI:
+    app = FastAPI(title="Fake Telegram Bot API")
+
+    @app.get("/stats")
+    def stats() -> Dict[str, Any]:
+        return fake.stats.as_dict()
+
+    @app.post("/stats/reset")
+    def reset_stats() -> Dict[str, Any]:
+        fake.stats = FakeTelegramStats()
+        return {"ok": True}
+
+    @app.api_route("/bot{token}/{method}", methods=["GET", "POST"])
+    async def bot_method(token: str, method: str, request: Request) -> JSONResponse:
+        params = await _params(request)
+        if method.lower() == "getupdates":
+            # behave like an idle long poll instead of a busy loop
+            await asyncio.sleep(min(float(params.get("timeout") or 0), 1.0))
+        return await fake.handle(method, params)
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests/s before 429; 0 = unlimited")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+    fake = FakeTelegram(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_limit=args.rate_limit,
+        retry_after=args.retry_after,
+    )
+    uvicorn.run(create_fake_telegram_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,108 @@
+"""Local stand-in for the Open-LLM-VTuber control API, for benchmarks.
+
+Point the admin at it with ``VTUBER_API_ROOT=http://127.0.0.1:7861``. It
+lists ``sessions`` fake client uids and answers the control endpoints
+(speak, system, respond) after an injected latency. ``/stats`` reports
+requests per endpoint and how many TCP connections were opened.
+
+Run standalone::
+
+    uv run python -m evai_bot.fake_vtuber --port 7861 --latency-ms 30 --sessions 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class FakeVtuberStats:
+    requests: Counter[str] = field(default_factory=Counter)
+    connections: int = 0
+    # (endpoint, client_uid, text) in arrival order
+    log: List[tuple[str, str, str]] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": dict(self.requests),
+            "total": sum(self.requests.values()),
+            "connections": self.connections,
+        }
+
+
+class FakeVtuber:
+    def __init__(self, *, latency_ms: float = 0.0, jitter_ms: float = 0.0, sessions: int = 2) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.sessions = [f"client-{i + 1}" for i in range(sessions)]
+        self.stats = FakeVtuberStats()
+
+    async def delay(self) -> None:
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            await asyncio.sleep(latency / 1000.0)
+
+    async def control(self, endpoint: str, body: Dict[str, Any]) -> JSONResponse:
+        uid = str(body.get("client_uid") or "")
+        self.stats.requests[endpoint] += 1
+        self.stats.log.append((endpoint, uid, str(body.get("text") or "")))
+        await self.delay()
+        if uid and uid not in self.sessions:
+            return JSONResponse({"detail": f"unknown client_uid {uid}"}, status_code=404)
+        targets = self.sessions if body.get("apply_to_all") or not uid else [uid]
+        return JSONResponse({"status": "ok", "endpoint": endpoint, "clients": targets})
+
+
+def create_fake_vtuber_app(fake: FakeVtuber) -> FastAPI:
+    app = FastAPI(title="fake-vtuber")
+    peers: set[Any] = set()
+
+    @app.middleware("http")
+    async def _count_connections(request: Request, call_next):  # type: ignore[no-untyped-def]
+        # requests on one keep-alive connection share the client (host, port)
+        peer = request.scope.get("client")
+        if peer not in peers:
+            peers.add(peer)
+            fake.stats.connections += 1
+        return await call_next(request)
+
+    @app.get("/stats")
+    async def stats() -> Dict[str, Any]:
+        return fake.stats.as_dict()
+
+    @app.get("/v1/sessions")
+    async def sessions() -> List[str]:
+        fake.stats.requests["sessions"] += 1
+        await fake.delay()
+        return fake.sessions
+
+    @app.post("/v1/control/{endpoint}")
+    async def control(endpoint: str, request: Request) -> JSONResponse:
+        return await fake.control(endpoint, await request.json())
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7861)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--sessions", type=int, default=2)
+    args = parser.parse_args()
+    fake = FakeVtuber(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, sessions=args.sessions)
+    uvicorn.run(create_fake_vtuber_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
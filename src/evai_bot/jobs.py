@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import func, insert, update
+from sqlmodel import select
+
+from .db import get_session, run_db
+from .models import BroadcastJob, BroadcastOutbox
+from .telegram_sender import OutgoingMessage, SendResult, shared_sender
+
+
+logger = logging.getLogger(__name__)
+
+# Results are written back to the outbox in batches; after a crash at most the
+# last unflushed batch can be sent twice.
+FLUSH_INTERVAL = 0.5
+
+
+def create_broadcast_job(
+    *, kind: str, title: str, method: str, payload: Dict[str, Any], chat_ids: Sequence[int]
+) -> int:
+    """Persist a job and its per-recipient outbox; returns the job id."""
+    unique_ids = list(dict.fromkeys(chat_ids))
+    with get_session() as session:
+        job = BroadcastJob(
+            kind=kind,
+            title=title,
+            method=method,
+            payload_json=json.dumps(payload, ensure_ascii=False),
+            total=len(unique_ids),
+        )
+        session.add(job)
+        session.flush()
+        if unique_ids:
+            session.execute(
+                insert(BroadcastOutbox),
+                [{"job_id": job.id, "chat_id": chat_id} for chat_id in unique_ids],
+            )
+        session.commit()
+        return job.id or 0
+
+
+def job_progress(job_id: int) -> Optional[Dict[str, Any]]:
+    with get_session() as session:
+        job = session.get(BroadcastJob, job_id)
+        if not job:
+            return None
+        by_status = dict(
+            session.exec(
+                select(BroadcastOutbox.status, func.count())
+                .where(BroadcastOutbox.job_id == job_id)
+                .group_by(BroadcastOutbox.status)
+            ).all()
+        )
+    sent = by_status.get("sent", 0)
+    failed = by_status.get("failed", 0)
+    rate = 0.0
+    if job.started_at:
+        # after a restart, measure only the resumed part so downtime does not count
+        since = job.resumed_at or job.started_at
+        done_before = job.resumed_done if job.resumed_at else 0
+        elapsed = ((job.finished_at or datetime.utcnow()) - since).total_seconds()
+        rate = (sent + failed - done_before) / elapsed if elapsed > 0 else 0.0
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "title": job.title,
+        "status": job.status,
+        "total": job.total,
+        "sent": sent,
+        "failed": failed,
+        "remaining": by_status.get("pending", 0),
+        "msgs_per_sec": round(rate, 2),
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "resumed_at": job.resumed_at.isoformat() if job.resumed_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def _start_job(job_id: int) -> tuple[Optional[BroadcastJob], List[BroadcastOutbox]]:
+    with get_session() as session:
+        job = session.get(BroadcastJob, job_id)
+        if not job or job.status == "done":
+            return None, []
+        pending = list(
+            session.exec(
+                select(BroadcastOutbox).where(
+                    (BroadcastOutbox.job_id == job_id) & (BroadcastOutbox.status == "pending")
+                )
+            ).all()
+        )
+        if job.status == "pending":
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+        else:
+            # resumed after a restart
+            job.resumed_at = datetime.utcnow()
+            job.resumed_done = job.total - len(pending)
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        return job, pending
+
+
+def _store_results(rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    with get_session() as session:
+        session.execute(update(BroadcastOutbox), rows)
+        session.commit()
+
+
+def _finish_job(job_id: int) -> None:
+    with get_session() as session:
+        job = session.get(BroadcastJob, job_id)
+        if not job:
+            return
+        job.status = "done"
+        job.finished_at = datetime.utcnow()
+        session.add(job)
+        session.commit()
+
+
+def _pending_job_ids() -> List[int]:
+    with get_session() as session:
+        return [
+            j.id or 0
+            for j in session.exec(
+                select(BroadcastJob)
+                .where(BroadcastJob.status.in_(["pending", "running"]))
+                .order_by(BroadcastJob.id)
+            ).all()
+        ]
+
+
+class BroadcastRunner:
+    """Runs broadcast jobs as background tasks on the event loop."""
+
+    def __init__(self) -> None:
+        self._tasks: Dict[int, asyncio.Task[None]] = {}
+
+    def submit(self, job_id: int) -> None:
+        """Schedule a job; must be called on the event loop thread."""
+        task = self._tasks.get(job_id)
+        if task and not task.done():
+            return
+        self._tasks[job_id] = asyncio.get_running_loop().create_task(self._run(job_id))
+
+    async def resume_pending(self) -> None:
+        for job_id in await run_db(_pending_job_ids):
+            logger.info("Resuming broadcast job #%s", job_id)
+            self.submit(job_id)
+
+    async def _run(self, job_id: int) -> None:
+        try:
+            job, pending = await run_db(_start_job, job_id)
+            if not job:
+                return
+            payload = json.loads(job.payload_json)
+            outbox_ids = {row.chat_id: row.id for row in pending}
+            messages = [OutgoingMessage(row.chat_id, job.method, payload) for row in pending]
+
+            buffer: List[Dict[str, Any]] = []
+
+            def on_result(result: SendResult) -> None:
+                buffer.append(
+                    {
+                        "id": outbox_ids[result.chat_id],
+                        "status": "sent" if result.ok else "failed",
+                        "attempts": result.attempts,
+                        "error": result.error,
+                        "sent_at": datetime.utcnow() if result.ok else None,
+                    }
+                )
+
+            async def flush() -> None:
+                batch = buffer[:]
+                del buffer[:]
+                await run_db(_store_results, batch)
+
+            # shared sender: concurrent and resumed jobs stay within one global rate
+            sender = shared_sender()
+            send_task = asyncio.create_task(sender.send_many(messages, on_result=on_result))
+            while not send_task.done():
+                await asyncio.wait({send_task}, timeout=FLUSH_INTERVAL)
+                await flush()
+            report = send_task.result()
+            await flush()
+            await run_db(_finish_job, job_id)
+            logger.info(
+                "Broadcast job #%s done: sent %s, failed %s in %.1fs",
+                job_id, report.sent, report.failed, report.elapsed,
+            )
+        except Exception:
+            logger.exception("Broadcast job #%s crashed", job_id)
+        finally:
+            self._tasks.pop(job_id, None)
+
+
+broadcast_runner = BroadcastRunner()
@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlmodel import select
+
+from .config import Settings
+from .db import dialect_insert, get_session, run_db
+from .metrics import VOTES_RECEIVED, VOTES_WRITTEN, registry
+from .models import LivePollVote
+
+
+logger = logging.getLogger(__name__)
+
+
+TallyKey = Tuple[str, str]  # (survey_key, question_id)
+
+
+class LiveTallies:
+    """In-memory vote counts per live poll question.
+
+    Loaded once from ``LivePollVote`` and then kept up to date by the vote
+    path, so readers never scan votes. The current vote of every user is kept
+    too, so a changed vote can be accounted for without reading the DB.
+    Push viewers subscribe per survey key and are woken up whenever its
+    counts or its active question change.
+    """
+
+    def __init__(self) -> None:
+        self._counts: Dict[TallyKey, Counter[str]] = {}
+        self._votes: Dict[TallyKey, Dict[int, str]] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._subscribers: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+        self._question_versions: Dict[str, int] = {}
+
+    def rebuild(self) -> None:
+        stmt = select(
+            LivePollVote.user_id,
+            LivePollVote.survey_key,
+            LivePollVote.question_id,
+            LivePollVote.value,
+        ).order_by(LivePollVote.id)
+        counts: Dict[TallyKey, Counter[str]] = {}
+        votes: Dict[TallyKey, Dict[int, str]] = {}
+        with get_session() as session:
+            for user_id, survey_key, question_id, value in session.exec(stmt):
+                votes.setdefault((survey_key, question_id), {})[user_id] = value
+        for key, by_user in votes.items():
+            counts[key] = Counter(by_user.values())
+        with self._lock:
+            self._counts = counts
+            self._votes = votes
+            self._loaded = True
+
+    def ensure_loaded(self) -> None:
+        """Rebuild from the DB unless already loaded (call at startup)."""
+        if not self._loaded:
+            self.rebuild()
+
+    def record(self, user_id: int, survey_key: str, question_id: str, value: str) -> bool:
+        """Account for the user's vote (+1 new value, -1 previous); False if unchanged."""
+        key = (survey_key, question_id)
+        with self._lock:
+            by_user = self._votes.setdefault(key, {})
+            previous = by_user.get(user_id)
+            if previous == value:
+                return False
+            by_user[user_id] = value
+            counter = self._counts.setdefault(key, Counter())
+            counter[value] += 1
+            if previous is not None:
+                counter[previous] -= 1
+                if counter[previous] <= 0:
+                    del counter[previous]
+        self.notify(survey_key)
+        return True
+
+    def forget_users(self, user_ids: Iterable[int]) -> None:
+        """Take the votes of deleted users out of the counts."""
+        ids = set(user_ids)
+        changed: Set[str] = set()
+        with self._lock:
+            for key, by_user in self._votes.items():
+                for user_id in ids & by_user.keys():
+                    value = by_user.pop(user_id)
+                    counter = self._counts.get(key)
+                    if counter is not None:
+                        counter[value] -= 1
+                        if counter[value] <= 0:
+                            del counter[value]
+                    changed.add(key[0])
+        for survey_key in changed:
+            self.notify(survey_key)
+
+    def counts(self, survey_key: str, question_id: str) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts.get((survey_key, question_id), {}))
+
+    # ---- push subscriptions ----
+
+    def subscribe(self, survey_key: str) -> asyncio.Event:
+        """Return an event that is set on every change for ``survey_key``.
+
+        Must be called from the event loop that will wait on the event.
+        """
+        event = asyncio.Event()
+        entry = (asyncio.get_running_loop(), event)
+        with self._lock:
+            self._subscribers.setdefault(survey_key, set()).add(entry)
+        return event
+
+    def unsubscribe(self, survey_key: str, event: asyncio.Event) -> None:
+        with self._lock:
+            subs = self._subscribers.get(survey_key)
+            if not subs:
+                return
+            for entry in [e for e in subs if e[1] is event]:
+                subs.discard(entry)
+            if not subs:
+                del self._subscribers[survey_key]
+
+    def notify(self, survey_key: str) -> None:
+        """Wake subscribers of ``survey_key``; safe to call from any thread."""
+        with self._lock:
+            subs = list(self._subscribers.get(survey_key, ()))
+        for loop, event in subs:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # loop already closed
+                continue
+
+    def question_changed(self, survey_key: str) -> None:
+        """Signal that the active question of ``survey_key`` was switched."""
+        with self._lock:
+            self._question_versions[survey_key] = self._question_versions.get(survey_key, 0) + 1
+        self.notify(survey_key)
+
+    def question_version(self, survey_key: str) -> int:
+        return self._question_versions.get(survey_key, 0)
+
+
+live_tallies = LiveTallies()
+
+
+VoteKey = Tuple[int, str, str]  # (user_id, survey_key, question_id)
+
+
+def write_votes(votes: Dict[VoteKey, str]) -> None:
+    """Persist the latest vote per (user, question) with one upsert statement."""
+    if not votes:
+        return
+    now = datetime.utcnow()
+    rows = [
+        {"user_id": user_id, "survey_key": survey_key, "question_id": question_id, "value": value, "created_at": now}
+        for (user_id, survey_key, question_id), value in votes.items()
+    ]
+    stmt = dialect_insert(LivePollVote)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "survey_key", "question_id"],
+        set_={"value": stmt.excluded.value},
+    )
+    with get_session() as session:
+        session.execute(stmt, rows)
+        session.commit()
+
+
+class VoteBuffer:
+    """Write-behind buffer for live poll votes.
+
+    ``add`` updates the in-memory tallies and returns at once. Repeated votes
+    of the same user for the same question collapse to the latest value.
+    Pending votes are written in one transaction every ``flush_interval``
+    seconds, as soon as ``max_pending`` accumulate, and on ``stop``.
+    """
+
+    def __init__(self, flush_interval: float = 0.2, max_pending: int = 500) -> None:
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[VoteKey, str] = {}
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self._stopping = False
+        self.flushed_votes = 0
+        self.flushes = 0
+
+    def add(self, user_id: int, survey_key: str, question_id: str, value: str) -> None:
+        VOTES_RECEIVED.inc()
+        live_tallies.record(user_id, survey_key, question_id, value)
+        with self._lock:
+            self._pending[(user_id, survey_key, question_id)] = value
+            full = len(self._pending) >= self.max_pending
+        if full and self._wakeup is not None:
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def discard_users(self, user_ids: Iterable[int]) -> None:
+        """Drop unwritten votes of users that are being deleted."""
+        ids = set(user_ids)
+        with self._lock:
+            self._pending = {key: value for key, value in self._pending.items() if key[0] not in ids}
+
+    async def flush(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        try:
+            await run_db(write_votes, batch)
+        except Exception:
+            logger.exception("Failed to write %s votes; will retry", len(batch))
+            with self._lock:
+                # keep newer votes that arrived meanwhile
+                for key, value in batch.items():
+                    self._pending.setdefault(key, value)
+            return
+        self.flushes += 1
+        self.flushed_votes += len(batch)
+        VOTES_WRITTEN.inc(len(batch))
+
+    def start(self) -> None:
+        """Start the periodic flusher on the running event loop."""
+        if self._task and not self._task.done():
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flusher and write everything still pending."""
+        # A flag rather than task.cancel(): wait_for() may swallow a cancellation
+        # that races with the wakeup event.
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+def _vote_buffer_from_settings() -> VoteBuffer:
+    settings = Settings()
+    return VoteBuffer(settings.vote_flush_ms / 1000.0, settings.vote_flush_max)
+
+
+vote_buffer = _vote_buffer_from_settings()
+registry.gauge("evai_vote_buffer_pending", "Live poll votes waiting to be written.", vote_buffer.pending)
@@ -0,0 +1,230 @@
+"""In-process metrics rendered in the Prometheus text format.
+
+Deliberately tiny (no client library): counters and fixed-bucket histograms
+guarded by a lock, plus gauges read from callbacks at scrape time. Metric
+objects are module-level singletons; ``registry.render()`` serves
+``/admin/metrics``.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values, strict=True)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Sample lines of this metric, without the HELP/TYPE header."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labelnames)
+        # an unlabelled counter is exported as 0 before its first increment
+        self._values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in sorted(items)]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, seconds: float, **labels: str) -> None:
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][idx] += 1
+            entry[1][0] += seconds
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(counts), total[0]) for k, (counts, total) in self._values.items()]
+        lines: List[str] = []
+        for key, counts, total in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts[:-1], strict=True):
+                cumulative += count
+                le = 'le="%s"' % _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge whose value is read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], float]) -> None:
+        super().__init__(name, help_text)
+        self.read = read
+
+    def samples(self) -> List[str]:
+        try:
+            value = float(self.read())
+        except Exception:
+            return []
+        return [f"{self.name} {_num(value)}"]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))  # type: ignore[return-value]
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, help_text, read))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            samples = metric.samples()
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+BOT_HANDLER_SECONDS = registry.histogram(
+    "evai_bot_handler_seconds", "Bot handler latency by event type and handler.", ["event", "handler"]
+)
+BOT_HANDLER_ERRORS = registry.counter(
+    "evai_bot_handler_errors_total", "Bot handler exceptions.", ["event", "handler"]
+)
+ADMIN_REQUEST_SECONDS = registry.histogram(
+    "evai_admin_request_seconds", "Admin app latency by route (until the response starts).", ["method", "route"]
+)
+ADMIN_RESPONSES = registry.counter(
+    "evai_admin_responses_total", "Admin app responses by route and status.", ["method", "route", "status"]
+)
+SQL_SECONDS = registry.histogram(
+    "evai_sql_statement_seconds", "SQL statement execution time by statement type.", ["operation"]
+)
+OUTBOUND_SECONDS = registry.histogram(
+    "evai_outbound_request_seconds", "Outbound HTTP call latency (Telegram, VTuber).", ["target", "method"]
+)
+OUTBOUND_ERRORS = registry.counter(
+    "evai_outbound_errors_total", "Failed outbound HTTP calls.", ["target", "method", "reason"]
+)
+QUERIES_PER_UNIT = registry.histogram(
+    "evai_sql_statements_per_unit",
+    "SQL statements per admin request or bot update.",
+    ["kind"],
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+VOTES_RECEIVED = registry.counter("evai_votes_received_total", "Live poll votes received by the bot.")
+VOTES_WRITTEN = registry.counter("evai_votes_written_total", "Live poll votes written to the DB.")
+VTUBER_QUEUE_WAIT_SECONDS = registry.histogram(
+    "evai_vtuber_queue_wait_seconds", "Time VTuber commands spent queued before being sent.", ["kind"]
+)
+VTUBER_COMMAND_SECONDS = registry.histogram(
+    "evai_vtuber_command_seconds", "VTuber command execution time by kind and outcome.", ["kind", "status"]
+)
+
+
+@contextmanager
+def track_outbound(target: str, method: str) -> Iterator[None]:
+    """Time an outbound call; an exception counts as an error with its type as reason."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        OUTBOUND_ERRORS.inc(target=target, method=method, reason=type(e).__name__)
+        raise
+    finally:
+        OUTBOUND_SECONDS.observe(time.perf_counter() - started, target=target, method=method)
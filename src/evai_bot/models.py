@@ -1,25 +1,36 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
-from sqlmodel import Field, SQLModel
+from sqlalchemy import Index, func
+from sqlalchemy.orm import relationship
+from sqlmodel import Field, Relationship, SQLModel
 
 
 class User(SQLModel, table=True):
+    __table_args__ = (
+        # keyset pagination of the admin user list
+        Index("ix_user_created_at_id", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
 
     # Telegram identity
     tg_id: int = Field(index=True, unique=True)
     username: Optional[str] = None
-    first_name: Optional[str] = None
-    last_name: Optional[str] = None
+    first_name: Optional[str] = Field(default=None, index=True)
+    last_name: Optional[str] = Field(default=None, index=True)
 
     # Registration status flags (expand later with survey progress)
     is_registered: bool = Field(default=False)
 
 
+# case-insensitive username prefix search (Telegram usernames are ASCII)
+Index("ix_user_username_lower", func.lower(User.__table__.c.username))
+
+
 # Placeholder entities for upcoming survey engine
 class Survey(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -42,22 +53,48 @@ class SurveyRun(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
     completed_at: Optional[datetime] = None
-    user_id: int = Field(foreign_key="user.id")
+    user_id: int = Field(foreign_key="user.id", index=True)
     survey_key: str = Field(index=True)
     current_index: int = Field(default=0)
 
+    # explicit relationship(): the annotations are strings (postponed evaluation)
+    answers: List["SurveyAnswer"] = Relationship(
+        sa_relationship=relationship("SurveyAnswer", back_populates="run", order_by="SurveyAnswer.created_at")
+    )
+
 
 class SurveyAnswer(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
-    run_id: int = Field(foreign_key="surveyrun.id")
+    run_id: int = Field(foreign_key="surveyrun.id", index=True)
     question_id: str = Field(index=True)
     answer_text: Optional[str] = None
     answer_choice: Optional[str] = None
 
+    run: Optional[SurveyRun] = Relationship(sa_relationship=relationship("SurveyRun", back_populates="answers"))
+
+
+# Materialised choice counts per survey question, kept in step with SurveyAnswer
+# (see surveys.tallies); rebuild with `python -m evai_bot.surveys.tallies`
+class ChoiceTally(SQLModel, table=True):
+    __table_args__ = (
+        Index("ux_choicetally_choice", "survey_key", "question_id", "value", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    survey_key: str
+    question_id: str
+    value: str
+    answers: int = Field(default=0)  # every recorded answer, runs in progress included
+    completed: int = Field(default=0)  # answers of completed runs only
+
 
 # Live poll votes (one vote per user per survey_key/question)
 class LivePollVote(SQLModel, table=True):
+    __table_args__ = (
+        Index("ux_livepollvote_user_question", "user_id", "survey_key", "question_id", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
     user_id: int = Field(foreign_key="user.id")
@@ -72,3 +109,30 @@ class LivePollState(SQLModel, table=True):
     survey_key: str
     question_id: str
     image_url: Optional[str] = None
+
+
+# Background broadcast jobs: one outbox row per recipient so a restart resumes
+class BroadcastJob(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    # last resume after a restart and recipients already done by then (for msgs/s)
+    resumed_at: Optional[datetime] = None
+    resumed_done: int = Field(default=0)
+    kind: str  # "message" | "poll"
+    title: str = ""
+    method: str  # Bot API method, e.g. "sendMessage"
+    payload_json: str  # common payload without chat_id
+    status: str = Field(default="pending", index=True)  # pending | running | done
+    total: int = Field(default=0)
+
+
+class BroadcastOutbox(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: int = Field(foreign_key="broadcastjob.id", index=True)
+    chat_id: int
+    status: str = Field(default="pending")  # pending | sent | failed
+    attempts: int = Field(default=0)
+    error: Optional[str] = None
+    sent_at: Optional[datetime] = None
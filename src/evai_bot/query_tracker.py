@@ -0,0 +1,113 @@
+"""Per-request / per-update SQL statement accounting and an N+1 detector.
+
+``track_queries`` installs a ``QueryStats`` in a context variable; the engine
+hook in ``db`` feeds every executed statement into it. Work pushed to
+``run_db`` or to the admin threadpool copies the context, so statements run
+there are attributed to the same request. When the block ends, a statement
+shape repeated more than ``repeat_warn`` times is logged as a likely N+1,
+and exceeding ``budget`` statements is logged — or raised with
+``strict`` (test mode, ``QUERY_BUDGET_STRICT=1``). Nested blocks also count
+towards the enclosing one.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+from .config import Settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class QueryPolicy:
+    repeat_warn: int = 10  # same statement shape more often than this = N+1 warning; 0 = off
+    budget: int = 0  # max statements per request/update; 0 = unlimited
+    strict: bool = False  # raise QueryBudgetExceeded instead of logging
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "QueryPolicy":
+        return cls(settings.query_repeat_warn, settings.query_budget, settings.query_budget_strict)
+
+
+@dataclass
+class QueryStats:
+    label: str
+    count: int = 0
+    seconds: float = 0.0
+    shapes: Counter[str] = field(default_factory=Counter)
+    parent: Optional["QueryStats"] = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, statement: str, seconds: float) -> None:
+        shape = statement_shape(statement)
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            self.shapes[shape] += 1
+        if self.parent is not None:
+            self.parent.record(statement, seconds)
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statement shapes executed more than ``threshold`` times."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n > threshold]
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("evai_query_stats", default=None)
+
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)|\(\s*%\(\w+\)s(?:\s*,\s*%\(\w+\)s)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Statement text with whitespace and expanded IN lists collapsed."""
+    return _IN_LIST.sub("(?)", _SPACES.sub(" ", statement).strip())
+
+
+def record_statement(statement: str, seconds: float) -> None:
+    """Engine hook: account a finished statement to the current request, if any."""
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, seconds)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def track_queries(label: str, policy: Optional[QueryPolicy] = None) -> Iterator[QueryStats]:
+    policy = policy or default_policy
+    stats = QueryStats(label, parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+    check(stats, policy)
+
+
+def check(stats: QueryStats, policy: QueryPolicy) -> None:
+    if policy.repeat_warn > 0:
+        for shape, n in stats.repeated(policy.repeat_warn):
+            logger.warning("Possible N+1 in %s: statement ran %d times: %s", stats.label, n, shape[:300])
+    if policy.budget > 0 and stats.count > policy.budget:
+        message = f"{stats.label} ran {stats.count} SQL statements (budget {policy.budget})"
+        if policy.strict:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+default_policy = QueryPolicy.from_settings(Settings())
@@ -1,25 +1,237 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
 
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import select
 
-from ..db import engine, get_session
+from ..config import Settings
+from ..db import engine, get_session, run_db
+from ..live import live_tallies, write_votes
 from ..models import SurveyAnswer, SurveyRun, User
+from ..user_cache import user_cache
+from .results import survey_results
+from .tallies import count_answer, count_completed_run
 from .schema import QuestionSpec, SurveySpec
 
 
 SURVEYS_DIR = Path(__file__).resolve().parent / "data"
 
 
+@dataclass(frozen=True)
+class SpecIndex:
+    """Lookup tables compiled once per spec version, for rendering stored answers."""
+
+    prompts: Dict[str, str]
+    choice_labels: Dict[str, Dict[str, str]]
+
+    @classmethod
+    def build(cls, spec: SurveySpec) -> "SpecIndex":
+        return cls(
+            prompts={q.id: q.prompt for q in spec.questions},
+            choice_labels={q.id: {c.value: c.label for c in (q.choices or [])} for q in spec.questions},
+        )
+
+    def label(self, question_id: str, value: str) -> str:
+        """Choice label for a stored value; the raw value if the spec no longer has it."""
+        return self.choice_labels.get(question_id, {}).get(value, value)
+
+
+@dataclass
+class _CompiledSpec:
+    spec: SurveySpec
+    mtime_ns: int
+    size: int
+    digest: str
+    checked_at: float
+    index: SpecIndex
+
+
+class SurveyRegistry:
+    """Process-wide cache of validated survey specs keyed by survey key.
+
+    A file is stat()-ed at most once per ``check_interval`` seconds; it is
+    re-read only when its mtime/size changed and re-validated only when its
+    content hash changed. Returned specs are shared: treat them as read-only.
+    """
+
+    def __init__(self, directory: Path, check_interval: float = 2.0) -> None:
+        self.directory = directory
+        self.check_interval = check_interval
+        self._specs: Dict[str, _CompiledSpec] = {}
+        self._keys: List[str] = []
+        self._keys_checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def get(self, key: str) -> SurveySpec:
+        now = time.monotonic()
+        entry = self._specs.get(key)
+        if entry is not None and now - entry.checked_at < self.check_interval:
+            self.hits += 1
+            return entry.spec
+        with self._lock:
+            return self._revalidate(key, now)
+
+    def index(self, key: str) -> SpecIndex:
+        """Compiled lookup tables of the current spec version."""
+        spec = self.get(key)
+        entry = self._specs.get(key)
+        if entry is not None and entry.spec is spec:
+            return entry.index
+        return SpecIndex.build(spec)
+
+    def keys(self) -> List[str]:
+        """Sorted survey keys (file stems) available in the data directory."""
+        now = time.monotonic()
+        checked_at = self._keys_checked_at
+        if checked_at is None or now - checked_at >= self.check_interval:
+            with self._lock:
+                self._keys = sorted(p.stem for p in self.directory.glob("*.json"))
+                self._keys_checked_at = now
+        return list(self._keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._specs.clear()
+            self._keys_checked_at = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "cached": len(self._specs),
+        }
+
+    def _revalidate(self, key: str, now: float) -> SurveySpec:
+        path = self.directory / f"{key}.json"
+        entry = self._specs.get(key)
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            self._specs.pop(key, None)
+            raise FileNotFoundError(f"Survey file not found: {path}") from None
+        if entry is not None and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+            entry.checked_at = now
+            self.hits += 1
+            return entry.spec
+        raw = path.read_bytes()
+        digest = hashlib.sha1(raw).hexdigest()
+        if entry is not None and entry.digest == digest:
+            # touched but unchanged — no need to parse again
+            entry.mtime_ns, entry.size, entry.checked_at = st.st_mtime_ns, st.st_size, now
+            self.hits += 1
+            return entry.spec
+        spec = SurveySpec.model_validate(json.loads(raw.decode("utf-8")))
+        self.misses += 1
+        if entry is not None:
+            self.reloads += 1
+        self._specs[key] = _CompiledSpec(spec, st.st_mtime_ns, st.st_size, digest, now, SpecIndex.build(spec))
+        return spec
+
+
+survey_registry = SurveyRegistry(SURVEYS_DIR, Settings().survey_reload_interval)
+
+
+@dataclass(frozen=True)
+class ActiveRun:
+    run_id: int
+    survey_key: str
+    current_index: int
+
+
+class ActiveRunIndex:
+    """In-memory map of unfinished survey runs by Telegram id.
+
+    Kept in sync by ``start_survey_run``, ``record_answer_and_advance`` and
+    ``complete_run`` and rebuilt from the DB at startup, so free-text
+    messages from users without an active run need no DB access.
+    """
+
+    def __init__(self) -> None:
+        self._runs_by_tg: Dict[int, Dict[int, ActiveRun]] = {}
+        self._tg_by_run: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def rebuild(self) -> None:
+        stmt = (
+            select(SurveyRun.id, SurveyRun.survey_key, SurveyRun.current_index, User.tg_id)
+            .join(User, User.id == SurveyRun.user_id)
+            .where(SurveyRun.completed_at.is_(None))
+        )
+        runs_by_tg: Dict[int, Dict[int, ActiveRun]] = {}
+        tg_by_run: Dict[int, int] = {}
+        with get_session() as session:
+            for run_id, survey_key, current_index, tg_id in session.exec(stmt):
+                runs_by_tg.setdefault(tg_id, {})[run_id] = ActiveRun(run_id, survey_key, current_index)
+                tg_by_run[run_id] = tg_id
+        with self._lock:
+            self._runs_by_tg = runs_by_tg
+            self._tg_by_run = tg_by_run
+            self._loaded = True
+
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.rebuild()
+
+    def get(self, tg_id: int) -> Optional[ActiveRun]:
+        """The user's active run; the oldest one if several surveys are open."""
+        runs = self._runs_by_tg.get(tg_id)
+        if not runs:
+            return None
+        with self._lock:
+            return min(runs.values(), key=lambda r: r.run_id, default=None)
+
+    def set(self, tg_id: int, run: SurveyRun) -> None:
+        if run.id is None:
+            return
+        with self._lock:
+            self._runs_by_tg.setdefault(tg_id, {})[run.id] = ActiveRun(run.id, run.survey_key, run.current_index)
+            self._tg_by_run[run.id] = tg_id
+
+    def advance(self, run: SurveyRun) -> None:
+        with self._lock:
+            tg_id = self._tg_by_run.get(run.id or 0)
+            if tg_id is None:
+                return
+            self._runs_by_tg[tg_id][run.id or 0] = ActiveRun(run.id or 0, run.survey_key, run.current_index)
+
+    def remove(self, run_id: int) -> None:
+        with self._lock:
+            tg_id = self._tg_by_run.pop(run_id, None)
+            if tg_id is None:
+                return
+            runs = self._runs_by_tg.get(tg_id, {})
+            runs.pop(run_id, None)
+            if not runs:
+                self._runs_by_tg.pop(tg_id, None)
+
+    def forget_user(self, tg_id: int) -> None:
+        with self._lock:
+            for run_id in self._runs_by_tg.pop(tg_id, {}):
+                self._tg_by_run.pop(run_id, None)
+
+
+active_runs = ActiveRunIndex()
+
+
 def load_survey(key: str) -> SurveySpec:
-    path = SURVEYS_DIR / f"{key}.json"
-    if not path.exists():
-        raise FileNotFoundError(f"Survey file not found: {path}")
-    data = json.loads(path.read_text(encoding="utf-8"))
-    return SurveySpec.model_validate(data)
+    return survey_registry.get(key)
+
+
+def list_survey_keys() -> List[str]:
+    return survey_registry.keys()
 
 
 def get_or_create_user(tg_id: int, username: Optional[str], first_name: Optional[str], last_name: Optional[str]) -> User:
@@ -41,14 +253,42 @@ def get_or_create_user(tg_id: int, username: Optional[str], first_name: Optional
             if changed:
                 session.add(user)
                 session.commit()
+                # keep attributes loaded: the instance is used after the session closes
+                session.refresh(user)
             return user
         user = User(tg_id=tg_id, username=username, first_name=first_name, last_name=last_name)
         session.add(user)
-        session.commit()
+        try:
+            session.commit()
+        except IntegrityError:
+            # created concurrently by another update of the same user
+            session.rollback()
+            return session.exec(statement).one()
         session.refresh(user)
         return user
 
 
+def resolve_user_id(
+    tg_id: int, username: Optional[str], first_name: Optional[str], last_name: Optional[str]
+) -> int:
+    """Cached ``get_or_create_user`` returning only the user id.
+
+    Hits do not touch the DB; profile changes are written back in batches.
+    """
+    user_id = user_cache.lookup(tg_id, username, first_name, last_name)
+    if user_id is not None:
+        return user_id
+    return _load_user_into_cache(tg_id, username, first_name, last_name)
+
+
+def _load_user_into_cache(
+    tg_id: int, username: Optional[str], first_name: Optional[str], last_name: Optional[str]
+) -> int:
+    user = get_or_create_user(tg_id, username, first_name, last_name)
+    user_cache.put(tg_id, user)
+    return user.id or 0
+
+
 def start_survey_run(user_id: int, survey_key: str) -> SurveyRun:
     with get_session() as session:
         # If an unfinished run exists, reuse it
@@ -58,16 +298,18 @@ def start_survey_run(user_id: int, survey_key: str) -> SurveyRun:
             & (SurveyRun.completed_at.is_(None))
         )
         run = session.exec(stmt).first()
-        if run:
-            return run
-        run = SurveyRun(user_id=user_id, survey_key=survey_key, current_index=0)
-        session.add(run)
-        session.commit()
-        session.refresh(run)
+        if not run:
+            run = SurveyRun(user_id=user_id, survey_key=survey_key, current_index=0)
+            session.add(run)
+            session.commit()
+            session.refresh(run)
+        user = session.get(User, user_id)
+        if user:
+            active_runs.set(user.tg_id, run)
         return run
 
 
-def get_current_question(run: SurveyRun, spec: SurveySpec) -> Optional[QuestionSpec]:
+def get_current_question(run: SurveyRun | ActiveRun, spec: SurveySpec) -> Optional[QuestionSpec]:
     if run.current_index >= len(spec.questions):
         return None
     return spec.questions[run.current_index]
@@ -80,21 +322,79 @@ def record_answer_and_advance(run_id: int, question_id: str, *, text: Optional[s
             raise ValueError("run not found")
         ans = SurveyAnswer(run_id=run.id, question_id=question_id, answer_text=text, answer_choice=choice)
         session.add(ans)
+        if choice is not None:
+            count_answer(session, run.survey_key, question_id, choice)
         run.current_index += 1
         session.add(run)
         session.commit()
         session.refresh(run)
+        active_runs.advance(run)
         return run
 
 
-def complete_run(run_id: int) -> None:
-    from datetime import datetime
-
+def complete_run(run_id: int, *, mark_registered: bool = False) -> None:
     with get_session() as session:
         run = session.get(SurveyRun, run_id)
         if not run:
             return
+        survey_key = run.survey_key
+        if run.completed_at is None:
+            count_completed_run(session, run)
         run.completed_at = datetime.utcnow()
         session.add(run)
+        if mark_registered:
+            user = session.get(User, run.user_id)
+            if user:
+                user.is_registered = True
+                session.add(user)
         session.commit()
+    active_runs.remove(run_id)
+    survey_results.invalidate(survey_key)
+
+
+def record_live_vote(user_id: int, survey_key: str, question_id: str, value: str) -> None:
+    """Store the user's vote for a live poll question right away (one vote per user).
+
+    The bot goes through ``live.vote_buffer`` instead, which batches writes.
+    """
+    write_votes({(user_id, survey_key, question_id): value})
+    live_tallies.record(user_id, survey_key, question_id, value)
+
+
+# -------------------- Async API (used by the bot) --------------------
+# The functions above block on SQLite; bot handlers share the event loop with
+# the admin server, so they must go through these wrappers instead.
+
+
+async def aget_or_create_user(
+    tg_id: int, username: Optional[str], first_name: Optional[str], last_name: Optional[str]
+) -> User:
+    return await run_db(get_or_create_user, tg_id, username, first_name, last_name)
+
+
+async def aresolve_user_id(
+    tg_id: int, username: Optional[str], first_name: Optional[str], last_name: Optional[str]
+) -> int:
+    # cache hits are answered on the loop without a thread hop
+    user_id = user_cache.lookup(tg_id, username, first_name, last_name)
+    if user_id is not None:
+        return user_id
+    return await run_db(_load_user_into_cache, tg_id, username, first_name, last_name)
+
+
+async def astart_survey_run(user_id: int, survey_key: str) -> SurveyRun:
+    return await run_db(start_survey_run, user_id, survey_key)
+
+
+async def arecord_answer_and_advance(
+    run_id: int, question_id: str, *, text: Optional[str] = None, choice: Optional[str] = None
+) -> SurveyRun:
+    return await run_db(record_answer_and_advance, run_id, question_id, text=text, choice=choice)
+
+
+async def acomplete_run(run_id: int, *, mark_registered: bool = False) -> None:
+    await run_db(complete_run, run_id, mark_registered=mark_registered)
+
 
+async def arecord_live_vote(user_id: int, survey_key: str, question_id: str, value: str) -> None:
+    await run_db(record_live_vote, user_id, survey_key, question_id, value)
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import String, cast, func, literal
+from sqlmodel import select
+
+from ..db import get_session
+from ..models import SurveyAnswer, SurveyRun, User
+from .schema import SurveySpec
+from .tallies import read_tallies
+
+
+@dataclass
+class SurveyResults:
+    """What /admin/surveys shows for one survey (completed runs only)."""
+
+    participants: int = 0
+    # question id -> choice value -> number of answers
+    choice_counts: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    # participant-grouped "Question: answer" text, users ordered by display name
+    plain_text: str = ""
+
+
+def _display_name():  # type: ignore[no-untyped-def]
+    """SQL twin of the page's display name: "first last", else username, else user#id."""
+    full_name = func.trim(func.coalesce(User.first_name, "") + literal(" ") + func.coalesce(User.last_name, ""))
+    return func.coalesce(
+        func.nullif(full_name, ""),
+        func.nullif(User.username, ""),
+        literal("user#") + cast(User.id, String),
+    )
+
+
+def compute_survey_results(spec: SurveySpec) -> SurveyResults:
+    completed = (SurveyRun.survey_key == spec.key) & (SurveyRun.completed_at.is_not(None))
+    results = SurveyResults()
+    labels = {q.id: {c.value: c.label for c in (q.choices or [])} for q in spec.questions if q.type == "choice"}
+    # O(choices) rows from the materialised tallies instead of grouping the answers
+    results.choice_counts = {qid: counts for qid, counts in read_tallies(spec.key).items() if qid in labels}
+    with get_session() as session:
+        results.participants = session.exec(
+            select(func.count(func.distinct(SurveyRun.user_id))).where(completed)
+        ).one()
+
+        display = _display_name().label("display")
+        rows_stmt = (
+            select(
+                display,
+                User.id,
+                SurveyRun.id,
+                SurveyAnswer.question_id,
+                SurveyAnswer.answer_text,
+                SurveyAnswer.answer_choice,
+            )
+            .join(SurveyRun, SurveyRun.user_id == User.id)
+            .join(SurveyAnswer, SurveyAnswer.run_id == SurveyRun.id)
+            .where(completed)
+            .order_by(display, User.id, SurveyRun.created_at, SurveyRun.id)
+            .execution_options(yield_per=1000)
+        )
+        rows = session.exec(rows_stmt)
+        results.plain_text = _participant_text(spec, labels, rows)
+    return results
+
+
+def _participant_text(spec: SurveySpec, labels: Dict[str, Dict[str, str]], rows) -> str:  # type: ignore[no-untyped-def]
+    parts: List[str] = []
+    for (name, _user_id), user_rows in groupby(rows, key=lambda r: (r[0], r[1])):
+        parts.append(name)
+        for _run_id, run_rows in groupby(user_rows, key=lambda r: r[2]):
+            by_question = {r[3]: (r[4], r[5]) for r in run_rows}
+            for q in spec.questions:
+                answer = by_question.get(q.id)
+                if not answer:
+                    continue
+                text, choice = answer
+                if q.type == "choice":
+                    out = labels[q.id].get(choice or "", choice or "")
+                else:
+                    out = (text or "").replace("\n", " ").strip()
+                if out:
+                    parts.append(f"{q.prompt}: {out}")
+        parts.append("")
+    return "\n".join(parts)
+
+
+class SurveyResultsCache:
+    """Computed results per survey key, valid until a run of that survey completes.
+
+    Entries are also tied to the spec object, so an edited survey file (new
+    spec from the registry) recomputes as well.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, Tuple[Tuple[int, int], SurveySpec, SurveyResults]] = {}
+        self._versions: Dict[str, int] = {}
+        self._generation = 0  # bumped by invalidate() of all surveys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, spec: SurveySpec) -> SurveyResults:
+        with self._lock:
+            version = self._version(spec.key)
+            entry = self._entries.get(spec.key)
+            if entry and entry[0] == version and entry[1] is spec:
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+        results = compute_survey_results(spec)
+        with self._lock:
+            # keep it only if nothing changed while computing
+            if self._version(spec.key) == version:
+                self._entries[spec.key] = (version, spec, results)
+        return results
+
+    def _version(self, survey_key: str) -> Tuple[int, int]:
+        return self._generation, self._versions.get(survey_key, 0)
+
+    def invalidate(self, survey_key: Optional[str] = None) -> None:
+        """Drop results of one survey (new answers) or of all (e.g. a user was deleted)."""
+        with self._lock:
+            if survey_key is None:
+                self._generation += 1
+                self._entries.clear()
+                return
+            self._versions[survey_key] = self._versions.get(survey_key, 0) + 1
+            self._entries.pop(survey_key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+survey_results = SurveyResultsCache()
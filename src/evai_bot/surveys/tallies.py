@@ -0,0 +1,124 @@
+"""Materialised per-question choice counts (``ChoiceTally``).
+
+Kept in step with ``SurveyAnswer`` inside the same transactions that write
+answers: ``record_answer_and_advance`` adds to ``answers``,
+``complete_run`` adds the run's choices to ``completed``, and deleting
+users subtracts theirs. Readers get O(choices) rows instead of scanning the
+answers. Should the table ever drift (manual DB edits), rebuild it::
+
+    uv run python -m evai_bot.surveys.tallies
+"""
+
+from __future__ import annotations
+
+import argparse
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import Connection, case, delete, func, insert
+from sqlmodel import Session, select
+
+from ..db import dialect_insert, engine, get_session, init_db
+from ..models import ChoiceTally, SurveyAnswer, SurveyRun
+
+
+Delta = Tuple[str, str, str, int, int]  # (survey_key, question_id, value, answers, completed)
+
+
+def apply_deltas(session: Session, deltas: Iterable[Delta]) -> None:
+    """Add to the counters with one upsert; rows that drop to zero are removed."""
+    rows = [
+        {"survey_key": key, "question_id": qid, "value": value, "answers": answers, "completed": completed}
+        for key, qid, value, answers, completed in deltas
+        if answers or completed
+    ]
+    if not rows:
+        return
+    table = ChoiceTally.__table__
+    stmt = dialect_insert(ChoiceTally)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["survey_key", "question_id", "value"],
+        set_={
+            "answers": table.c.answers + stmt.excluded.answers,
+            "completed": table.c.completed + stmt.excluded.completed,
+        },
+    )
+    session.execute(stmt, rows)
+    if any(r["answers"] < 0 or r["completed"] < 0 for r in rows):
+        session.execute(delete(ChoiceTally).where(ChoiceTally.answers <= 0, ChoiceTally.completed <= 0))
+
+
+def count_answer(session: Session, survey_key: str, question_id: str, choice: str) -> None:
+    apply_deltas(session, [(survey_key, question_id, choice, 1, 0)])
+
+
+def count_completed_run(session: Session, run: SurveyRun) -> None:
+    """Add the choices of a run that has just been completed."""
+    stmt = (
+        select(SurveyAnswer.question_id, SurveyAnswer.answer_choice, func.count())
+        .where(SurveyAnswer.run_id == run.id, SurveyAnswer.answer_choice.is_not(None))
+        .group_by(SurveyAnswer.question_id, SurveyAnswer.answer_choice)
+    )
+    apply_deltas(session, [(run.survey_key, qid, value, 0, n) for qid, value, n in session.exec(stmt)])
+
+
+def subtract_users(session: Session, user_ids: List[int]) -> None:
+    """Take out the choices of users about to be deleted (before their answers go)."""
+    stmt = (
+        select(
+            SurveyRun.survey_key,
+            SurveyAnswer.question_id,
+            SurveyAnswer.answer_choice,
+            func.count(),
+            func.sum(case((SurveyRun.completed_at.is_not(None), 1), else_=0)),
+        )
+        .join(SurveyRun, SurveyRun.id == SurveyAnswer.run_id)
+        .where(SurveyRun.user_id.in_(user_ids), SurveyAnswer.answer_choice.is_not(None))
+        .group_by(SurveyRun.survey_key, SurveyAnswer.question_id, SurveyAnswer.answer_choice)
+    )
+    apply_deltas(session, [(key, qid, value, -n, -done) for key, qid, value, n, done in session.exec(stmt)])
+
+
+def rebuild_tallies(conn: Connection) -> int:
+    """Recount everything from ``SurveyAnswer``; returns the number of tally rows."""
+    conn.execute(delete(ChoiceTally))
+    counted = (
+        select(
+            SurveyRun.survey_key,
+            SurveyAnswer.question_id,
+            SurveyAnswer.answer_choice,
+            func.count(),
+            func.sum(case((SurveyRun.completed_at.is_not(None), 1), else_=0)),
+        )
+        .join(SurveyRun, SurveyRun.id == SurveyAnswer.run_id)
+        .where(SurveyAnswer.answer_choice.is_not(None))
+        .group_by(SurveyRun.survey_key, SurveyAnswer.question_id, SurveyAnswer.answer_choice)
+    )
+    conn.execute(
+        insert(ChoiceTally).from_select(["survey_key", "question_id", "value", "answers", "completed"], counted)
+    )
+    return conn.execute(select(func.count()).select_from(ChoiceTally)).scalar_one()
+
+
+def read_tallies(survey_key: str, completed_only: bool = True) -> Dict[str, Dict[str, int]]:
+    """question id -> choice value -> count, for one survey."""
+    column = ChoiceTally.completed if completed_only else ChoiceTally.answers
+    stmt = select(ChoiceTally.question_id, ChoiceTally.value, column).where(ChoiceTally.survey_key == survey_key)
+    counts: Dict[str, Dict[str, int]] = {}
+    with get_session() as session:
+        for qid, value, n in session.exec(stmt):
+            if n:
+                counts.setdefault(qid, {})[value] = n
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+    init_db()
+    with engine.begin() as conn:
+        rows = rebuild_tallies(conn)
+    print(f"choice tallies rebuilt: {rows} rows")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import httpx
+
+from .config import Settings
+from .metrics import OUTBOUND_ERRORS, OUTBOUND_SECONDS
+
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_BASE = "https://api.telegram.org"
+CHAT_SLOTS_PRUNE_AT = 10_000
+
+
+@dataclass
+class OutgoingMessage:
+    chat_id: int
+    method: str  # Bot API method, e.g. "sendMessage" / "sendPhoto"
+    payload: Dict[str, Any]
+
+
+@dataclass
+class SendResult:
+    chat_id: int
+    ok: bool
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    message_id: Optional[int] = None
+
+
+@dataclass
+class BroadcastReport:
+    results: List[SendResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def sent(self) -> int:
+        return sum(1 for r in self.results if r.ok)
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for r in self.results if not r.ok)
+
+
+class TokenBucket:
+    """Async token bucket; ``pause`` blocks all acquirers (used on HTTP 429)."""
+
+    def __init__(self, rate: float, burst: float = 1.0) -> None:
+        self.rate = max(rate, 0.001)
+        self.capacity = max(burst, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class TelegramSender:
+    """Concurrent Bot API sender with global and per-chat rate limits.
+
+    - a global token bucket (Telegram allows ~30 msg/s per bot);
+    - at most one message per ``per_chat_interval`` seconds to the same chat;
+    - at most ``concurrency`` requests in flight;
+    - HTTP 429 pauses every sender for ``retry_after`` seconds, then retries;
+      network errors and 5xx are retried with exponential backoff;
+      other errors (blocked bot, chat not found) fail the recipient at once.
+    """
+
+    def __init__(
+        self,
+        bot_token: str,
+        *,
+        api_base: str = TELEGRAM_API_BASE,
+        rate_per_sec: float = 30.0,
+        per_chat_interval: float = 1.0,
+        concurrency: int = 16,
+        max_retries: int = 3,
+        timeout: float = 10.0,
+    ) -> None:
+        self.api_url = f"{api_base.rstrip('/')}/bot{bot_token}"
+        self.bucket = TokenBucket(rate_per_sec)
+        self.per_chat_interval = per_chat_interval
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max(0, max_retries)
+        self.timeout = timeout
+        self._chat_next: Dict[int, float] = {}
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "TelegramSender":
+        return cls(
+            settings.bot_token,
+            api_base=settings.telegram_api_base,
+            rate_per_sec=settings.tg_rate_limit,
+            per_chat_interval=settings.tg_per_chat_interval,
+            concurrency=settings.tg_send_concurrency,
+            max_retries=settings.tg_send_retries,
+        )
+
+    async def send(self, message: OutgoingMessage, client: Optional[httpx.AsyncClient] = None) -> SendResult:
+        if client is None:
+            async with httpx.AsyncClient(timeout=self.timeout) as own:
+                return await self._send(own, message)
+        return await self._send(client, message)
+
+    async def send_many(
+        self,
+        messages: Iterable[OutgoingMessage],
+        on_result: Optional[Callable[[SendResult], None]] = None,
+    ) -> BroadcastReport:
+        """Send all messages; ``on_result`` is called as each recipient finishes."""
+        queue: asyncio.Queue[OutgoingMessage] = asyncio.Queue()
+        for m in messages:
+            queue.put_nowait(m)
+        report = BroadcastReport()
+        started = time.monotonic()
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits) as client:
+
+            async def worker() -> None:
+                while True:
+                    try:
+                        m = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    result = await self._send(client, m)
+                    report.results.append(result)
+                    if on_result is not None:
+                        on_result(result)
+
+            workers = min(self.concurrency, queue.qsize())
+            await asyncio.gather(*(worker() for _ in range(workers)))
+
+        report.elapsed = time.monotonic() - started
+        return report
+
+    async def _wait_chat_slot(self, chat_id: int) -> None:
+        now = time.monotonic()
+        if len(self._chat_next) > CHAT_SLOTS_PRUNE_AT:
+            # long-lived shared sender: forget chats whose spacing has elapsed
+            self._chat_next = {c: t for c, t in self._chat_next.items() if t > now}
+        next_at = self._chat_next.get(chat_id, 0.0)
+        self._chat_next[chat_id] = max(now, next_at) + self.per_chat_interval
+        if next_at > now:
+            await asyncio.sleep(next_at - now)
+
+    async def _send(self, client: httpx.AsyncClient, message: OutgoingMessage) -> SendResult:
+        result = SendResult(chat_id=message.chat_id, ok=False)
+        payload = {"chat_id": message.chat_id, **message.payload}
+        backoff = 0.5
+        while result.attempts <= self.max_retries:
+            await self._wait_chat_slot(message.chat_id)
+            await self.bucket.acquire()
+            result.attempts += 1
+            started = time.perf_counter()
+            try:
+                resp = await client.post(f"{self.api_url}/{message.method}", json=payload)
+            except httpx.HTTPError as e:
+                OUTBOUND_SECONDS.observe(time.perf_counter() - started, target="telegram", method=message.method)
+                OUTBOUND_ERRORS.inc(target="telegram", method=message.method, reason=type(e).__name__)
+                result.status_code, result.error = None, f"{type(e).__name__}: {e}"
+                if result.attempts <= self.max_retries:
+                    await asyncio.sleep(backoff)
+                    backoff *= 2
+                continue
+            OUTBOUND_SECONDS.observe(time.perf_counter() - started, target="telegram", method=message.method)
+            result.status_code = resp.status_code
+            try:
+                data = resp.json()
+            except ValueError:
+                data = {}
+            if resp.status_code == 200 and data.get("ok"):
+                result.ok, result.error = True, None
+                result.message_id = (data.get("result") or {}).get("message_id")
+                return result
+            result.error = str(data.get("description") or f"HTTP {resp.status_code}")
+            OUTBOUND_ERRORS.inc(target="telegram", method=message.method, reason=str(resp.status_code))
+            if resp.status_code == 429:
+                retry_after = float((data.get("parameters") or {}).get("retry_after") or 1)
+                logger.warning("Telegram flood limit: retry after %ss", retry_after)
+                self.bucket.pause(retry_after)
+                continue
+            if resp.status_code >= 500:
+                if result.attempts <= self.max_retries:
+                    await asyncio.sleep(backoff)
+                    backoff *= 2
+                continue
+            return result
+        return result
+
+
+@functools.lru_cache(maxsize=1)
+def shared_sender() -> TelegramSender:
+    """The process-wide sender; every send path must use it.
+
+    The rate limit and per-chat spacing live on the sender instance, so only
+    one shared instance keeps the whole process within Telegram's limits
+    (a direct message during a broadcast, or two broadcasts at once).
+    Built on first use, from the settings at that time.
+    """
+    return TelegramSender.from_settings(Settings())
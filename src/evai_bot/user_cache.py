@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, update
+
+from .config import Settings
+from .db import get_session, run_db
+from .metrics import registry
+from .models import User
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedUser:
+    id: int
+    username: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+
+
+class UserCache:
+    """Bounded LRU of Telegram identities: tg_id -> user id + profile fields.
+
+    Profile changes seen on cached users are not written immediately; they are
+    collected and written back in one batch by ``flush`` (periodically once
+    ``start`` is called, and on ``stop``).
+    """
+
+    def __init__(self, max_size: int = 10_000, flush_interval: float = 5.0) -> None:
+        self.max_size = max(1, max_size)
+        self.flush_interval = flush_interval
+        self._entries: OrderedDict[int, CachedUser] = OrderedDict()
+        self._tg_by_user_id: Dict[int, int] = {}
+        self._dirty: Dict[int, CachedUser] = {}  # user id -> profile to write
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task[None]] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(
+        self, tg_id: int, username: Optional[str], first_name: Optional[str], last_name: Optional[str]
+    ) -> Optional[int]:
+        """Return the cached user id (recording profile changes) or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(tg_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(tg_id)
+            self.hits += 1
+            # same rules as get_or_create_user: only non-empty values overwrite
+            changed = False
+            if username and entry.username != username:
+                entry.username = username
+                changed = True
+            if first_name and entry.first_name != first_name:
+                entry.first_name = first_name
+                changed = True
+            if last_name and entry.last_name != last_name:
+                entry.last_name = last_name
+                changed = True
+            if changed:
+                self._dirty[entry.id] = CachedUser(entry.id, entry.username, entry.first_name, entry.last_name)
+            return entry.id
+
+    def put(self, tg_id: int, user: User) -> None:
+        if user.id is None:
+            return
+        with self._lock:
+            self._entries[tg_id] = CachedUser(user.id, user.username, user.first_name, user.last_name)
+            self._entries.move_to_end(tg_id)
+            self._tg_by_user_id[user.id] = tg_id
+            while len(self._entries) > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._tg_by_user_id.pop(evicted.id, None)
+
+    def invalidate(self, user_id: int) -> None:
+        """Forget a user (after admin changes or deletion), including pending writes."""
+        with self._lock:
+            tg_id = self._tg_by_user_id.pop(user_id, None)
+            if tg_id is not None:
+                self._entries.pop(tg_id, None)
+            self._dirty.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tg_by_user_id.clear()
+            self._dirty.clear()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self._entries),
+            "dirty": len(self._dirty),
+        }
+
+    def write_back(self) -> int:
+        """Write pending profile changes in one statement; returns rows written."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+        stmt = (
+            update(User)
+            .where(User.id == bindparam("b_id"))
+            .values(
+                username=bindparam("b_username"),
+                first_name=bindparam("b_first_name"),
+                last_name=bindparam("b_last_name"),
+            )
+        )
+        rows = [
+            {"b_id": u.id, "b_username": u.username, "b_first_name": u.first_name, "b_last_name": u.last_name}
+            for u in dirty.values()
+        ]
+        try:
+            with get_session() as session:
+                session.connection().execute(stmt, rows)
+                session.commit()
+        except Exception:
+            with self._lock:
+                for user_id, u in dirty.items():
+                    self._dirty.setdefault(user_id, u)
+            raise
+        return len(rows)
+
+    async def flush(self) -> None:
+        try:
+            await run_db(self.write_back)
+        except Exception:
+            logger.exception("Failed to write back user profiles; will retry")
+
+    def start(self) -> None:
+        """Start periodic write-back on the running event loop."""
+        if self._task and not self._task.done():
+            return
+        self._stopping = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._stopping is not None:
+            self._stopping.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        assert self._stopping is not None
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.flush_interval)
+            except TimeoutError:
+                pass
+            await self.flush()
+
+
+def _user_cache_from_settings() -> UserCache:
+    settings = Settings()
+    return UserCache(settings.user_cache_size, settings.user_flush_interval)
+
+
+user_cache = _user_cache_from_settings()
+registry.gauge("evai_user_cache_size", "Telegram identities held in the bot's user cache.", lambda: user_cache.stats()["size"])
+registry.gauge("evai_user_cache_hit_rate", "Hit rate of the bot's user cache.", lambda: user_cache.stats()["hit_rate"])
@@ -0,0 +1,166 @@
+"""User queries for the admin: keyset pages, search, counts and bulk changes."""
+
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, func, not_, or_, tuple_, update
+from sqlmodel import select
+
+from .db import get_session
+from .models import LivePollVote, ParticipantResponse, SurveyAnswer, SurveyRun, User
+from .surveys.tallies import subtract_users
+
+
+PAGE_SIZE = 50
+MAX_INT64 = 2**63 - 1  # largest id/tg_id the database can bind
+
+Cursor = Tuple[datetime, int]  # (created_at, id) of a page's edge row
+
+
+def encode_cursor(user: User) -> str:
+    return f"{user.created_at.isoformat()}~{user.id}"
+
+
+def decode_cursor(value: Optional[str]) -> Optional[Cursor]:
+    if not value:
+        return None
+    try:
+        created_at, user_id = value.rsplit("~", 1)
+        cursor = datetime.fromisoformat(created_at), int(user_id)
+    except ValueError:
+        return None
+    return cursor if abs(cursor[1]) <= MAX_INT64 else None
+
+
+@dataclass
+class UserPage:
+    users: List[User]
+    next_cursor: Optional[str] = None  # older users
+    prev_cursor: Optional[str] = None  # newer users
+
+
+def list_users_page(
+    after: Optional[Cursor] = None,
+    before: Optional[Cursor] = None,
+    limit: int = PAGE_SIZE,
+) -> UserPage:
+    """Newest first; ``after``/``before`` are the last/first row of the page seen.
+
+    Keyset pagination on (created_at, id) using ``ix_user_created_at_id``:
+    every page costs the same regardless of how deep it is.
+    """
+    key = tuple_(User.created_at, User.id)
+    if before is not None:
+        stmt = select(User).where(key > before).order_by(User.created_at.asc(), User.id.asc())
+    else:
+        stmt = select(User).order_by(User.created_at.desc(), User.id.desc())
+        if after is not None:
+            stmt = stmt.where(key < after)
+    with get_session() as session:
+        users = list(session.exec(stmt.limit(limit + 1)).all())
+    more = len(users) > limit  # another page beyond this one in the direction walked
+    users = users[:limit]
+    if before is not None:
+        users.reverse()
+    if not users:
+        return UserPage(users)
+    newer = more if before is not None else after is not None
+    older = more if before is None else True
+    return UserPage(
+        users,
+        next_cursor=encode_cursor(users[-1]) if older else None,
+        prev_cursor=encode_cursor(users[0]) if newer else None,
+    )
+
+
+def _prefix_range(column, prefix: str):  # type: ignore[no-untyped-def]
+    """``column LIKE 'prefix%'`` written as a range, so a B-tree index is used."""
+    if ord(prefix[-1]) == sys.maxunicode:  # no next code point: open-ended range
+        return column >= prefix
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper)
+
+
+def search_users(query: str, limit: int = 20) -> List[User]:
+    """Users matching ``query``: exact id/tg_id, or a prefix of username/first/last name.
+
+    Username matching is case-insensitive (``ix_user_username_lower``). Names
+    are matched as typed and capitalised, on their own indexes; SQLite's
+    lower() only folds ASCII, which would miss Cyrillic names.
+    """
+    q = query.strip().lstrip("@")
+    if not q:
+        return []
+    conditions = [_prefix_range(func.lower(User.username), q.lower())]
+    for variant in dict.fromkeys([q, q[:1].upper() + q[1:]]):
+        conditions.append(_prefix_range(User.first_name, variant))
+        conditions.append(_prefix_range(User.last_name, variant))
+    # isdigit() also accepts '²' etc., which int() rejects; ids are signed 64-bit
+    if q.isascii() and q.isdigit() and int(q) <= MAX_INT64:
+        conditions.append(User.tg_id == int(q))
+        conditions.append(User.id == int(q))
+    stmt = select(User).where(or_(*conditions)).order_by(User.created_at.desc(), User.id.desc()).limit(limit)
+    with get_session() as session:
+        return list(session.exec(stmt).all())
+
+
+def user_counts() -> Dict[str, int]:
+    """Total and registered users in one COUNT query."""
+    stmt = select(func.count(), func.coalesce(func.sum(case((User.is_registered.is_(True), 1), else_=0)), 0))
+    with get_session() as session:
+        total, registered = session.exec(stmt).one()
+    return {"total": total, "registered": registered}
+
+
+def delete_users(user_ids: Iterable[int]) -> Dict[int, int]:
+    """Delete users with their runs, answers, votes and responses in one transaction.
+
+    Their choices are subtracted from the survey tallies in the same transaction.
+
+    Set-based: one DELETE per table, children selected by subquery, so the
+    cost does not grow with the number of runs. Returns user id -> tg_id of
+    the users actually deleted, for the caller to drop in-memory state.
+    """
+    ids = list(dict.fromkeys(user_ids))
+    if not ids:
+        return {}
+    with get_session() as session:
+        deleted = {
+            user_id: tg_id for user_id, tg_id in session.exec(select(User.id, User.tg_id).where(User.id.in_(ids)))
+        }
+        if not deleted:
+            return {}
+        ids = list(deleted)
+        subtract_users(session, ids)
+        runs = select(SurveyRun.id).where(SurveyRun.user_id.in_(ids))
+        for stmt in (
+            delete(SurveyAnswer).where(SurveyAnswer.run_id.in_(runs)),
+            delete(SurveyRun).where(SurveyRun.user_id.in_(ids)),
+            delete(LivePollVote).where(LivePollVote.user_id.in_(ids)),
+            delete(ParticipantResponse).where(ParticipantResponse.user_id.in_(ids)),
+            delete(User).where(User.id.in_(ids)),
+        ):
+            session.execute(stmt.execution_options(synchronize_session=False))
+        session.commit()
+    return deleted
+
+
+def set_registered(user_ids: Iterable[int], value: Optional[bool]) -> int:
+    """Set (or, with ``value=None``, flip) ``is_registered`` in one UPDATE; returns rows changed."""
+    ids = list(dict.fromkeys(user_ids))
+    if not ids:
+        return 0
+    new_value = not_(User.is_registered) if value is None else value
+    stmt = update(User).where(User.id.in_(ids)).values(is_registered=new_value)
+    with get_session() as session:
+        result = session.execute(stmt.execution_options(synchronize_session=False))
+        session.commit()
+    return result.rowcount
+
+
+def display_name(user: User) -> str:
+    return " ".join(filter(None, [user.first_name, user.last_name])) or (user.username or "-")
@@ -1,18 +1,82 @@
 from __future__ import annotations
 
+import asyncio
 from typing import Any, Dict, List, Optional
 
 import httpx
 
+from .config import Settings
+from .metrics import track_outbound
+
 
 class VtuberClient:
-    def __init__(self, base_url: str) -> None:
+    """Open-LLM-VTuber control API client.
+
+    One pooled ``httpx.AsyncClient`` is kept for the life of the object, so
+    calls reuse keep-alive connections instead of opening a TCP connection
+    each. It is created on first use (on the running loop) and released by
+    ``aclose``; the admin app does that on shutdown. Until then the object
+    is bound to that loop.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        timeout: float = 20.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+    ) -> None:
         self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        # listing sessions is cheap; do not keep the operator waiting as long
+        self._sessions_timeout = httpx.Timeout(min(timeout, 10.0), connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max(1, max_connections),
+            max_keepalive_connections=max(1, max_connections),
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "VtuberClient":
+        return cls(
+            settings.vtuber_api_root,
+            timeout=settings.vtuber_timeout,
+            connect_timeout=settings.vtuber_connect_timeout,
+            max_connections=settings.vtuber_max_connections,
+            keepalive_expiry=settings.vtuber_keepalive_expiry,
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is not None and not self._client.is_closed:
+            if self._loop is loop:
+                return self._client
+            # pooled connections belong to the loop that opened them and can only
+            # be closed there; switching would leak the old pool
+            raise RuntimeError("VtuberClient is bound to another event loop; await aclose() there first")
+        self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+        self._loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        client, self._client, self._loop = self._client, None, None
+        if client is not None:
+            await client.aclose()
+
+    async def _post(self, path: str, name: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with track_outbound("vtuber", name):
+            resp = await self.client.post(path, json=payload)
+            resp.raise_for_status()
+            return resp.json()
 
     async def list_sessions(self) -> List[str]:
-        url = f"{self.base_url}/v1/sessions"
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(url)
+        with track_outbound("vtuber", "sessions"):
+            resp = await self.client.get("/v1/sessions", timeout=self._sessions_timeout)
             resp.raise_for_status()
             data = resp.json()
             if not isinstance(data, list):
@@ -31,17 +95,12 @@ class VtuberClient:
         Matches POST /v1/control/speak
         Body: {"text":"...","client_uid":"<uid>|null","apply_to_all":false}
         """
-        url = f"{self.base_url}/v1/control/speak"
         payload: Dict[str, Any] = {"text": text}
         if client_uid:
             payload["client_uid"] = client_uid
         if apply_to_all is not None:
             payload["apply_to_all"] = apply_to_all
-
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            resp = await client.post(url, json=payload)
-            resp.raise_for_status()
-            return resp.json()
+        return await self._post("/v1/control/speak", "speak", payload)
 
     async def system_instruction(
         self,
@@ -51,16 +110,12 @@ class VtuberClient:
         mode: str = "append",
         apply_to_all: Optional[bool] = None,
     ) -> Dict[str, Any]:
-        url = f"{self.base_url}/v1/control/system"
         payload: Dict[str, Any] = {"text": text, "mode": mode}
         if client_uid:
             payload["client_uid"] = client_uid
         if apply_to_all is not None:
             payload["apply_to_all"] = apply_to_all
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            resp = await client.post(url, json=payload)
-            resp.raise_for_status()
-            return resp.json()
+        return await self._post("/v1/control/system", "system", payload)
 
     async def respond(
         self,
@@ -69,21 +124,17 @@ class VtuberClient:
         client_uid: Optional[str] = None,
         apply_to_all: Optional[bool] = None,
     ) -> Dict[str, Any]:
-        """Trigger an agent response (LLM turn). 
+        """Trigger an agent response (LLM turn).
 
         Matches POST /v1/control/respond
         Body: {"text":"...","client_uid":"<uid>|null","apply_to_all":false}
         """
-        url = f"{self.base_url}/v1/control/respond"
         payload: Dict[str, Any] = {"text": text}
         if client_uid:
             payload["client_uid"] = client_uid
         if apply_to_all is not None:
             payload["apply_to_all"] = apply_to_all
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            resp = await client.post(url, json=payload)
-            resp.raise_for_status()
-            return resp.json()
+        return await self._post("/v1/control/respond", "respond", payload)
 
     # Backward-compat alias for older admin code
     async def agent_say(
@@ -95,3 +146,6 @@ class VtuberClient:
     ) -> Dict[str, Any]:
         return await self.respond(text=text, client_uid=client_uid, apply_to_all=apply_to_all)
 
+
+# process-wide client used by the admin app
+vtuber_client = VtuberClient.from_settings(Settings())
@@ -0,0 +1,338 @@
+"""Background queue for VTuber control commands.
+
+The admin enqueues a command and returns at once; the operator's page polls
+its status. Commands are run one at a time per session (``client_uid``;
+broadcasts to all sessions share their own lane), so the avatar plays them
+in order. Within a session a queued ``speak`` goes before ``respond``,
+which goes before ``system`` — equal priorities keep their order. A
+``system`` append queued right behind another not yet started append for
+the same session is merged into it: one API call, texts joined by newlines.
+
+A broadcast reaches every session, so it is not run alongside them: once
+one is queued, session lanes finish their current command and wait; the
+broadcast starts when they are idle, and they resume after it. Fan-out
+(``fan_out``) queues one command per session, so it is ordered the same way.
+
+All methods must be called on the event loop thread.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .metrics import VTUBER_COMMAND_SECONDS, VTUBER_QUEUE_WAIT_SECONDS, registry
+from .vtuber_client import VtuberClient, vtuber_client
+
+
+logger = logging.getLogger(__name__)
+
+
+PRIORITIES = {"speak": 3, "respond": 2, "system": 1}
+ALL_SESSIONS = "*"  # lane of commands without client_uid / with apply_to_all
+
+
+@dataclass
+class VtuberCommand:
+    id: int
+    kind: str  # speak | respond | system
+    text: str
+    client_uid: Optional[str] = None
+    apply_to_all: Optional[bool] = None
+    mode: str = "append"  # system only
+    status: str = "queued"  # queued | running | done | failed | merged | cancelled
+    merged_into: Optional[int] = None
+    merged: int = 0  # appends folded into this command
+    mergeable: bool = True
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    finished: asyncio.Event = field(default_factory=asyncio.Event, repr=False, compare=False)
+    merged_with: Optional["VtuberCommand"] = field(default=None, repr=False, compare=False)
+
+    @property
+    def lane(self) -> str:
+        return ALL_SESSIONS if self.apply_to_all or not self.client_uid else self.client_uid
+
+    def can_absorb(self, other: "VtuberCommand") -> bool:
+        return (
+            self.status == "queued"
+            and self.mergeable
+            and other.mergeable
+            and self.kind == other.kind == "system"
+            and self.mode == other.mode == "append"
+            and self.lane == other.lane
+            and bool(self.apply_to_all) == bool(other.apply_to_all)
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "text": self.text,
+            "client_uid": self.client_uid,
+            "apply_to_all": self.apply_to_all,
+            "status": self.status,
+            "merged_into": self.merged_into,
+            "merged": self.merged,
+            "result": self.result,
+            "error": self.error,
+            "queued_ms": _ms(self.created_at, self.started_at),
+            "run_ms": _ms(self.started_at, self.finished_at),
+        }
+
+
+@dataclass
+class SessionResult:
+    client_uid: str
+    ok: bool
+    latency_ms: float = 0.0
+    result: Any = None
+    error: Optional[str] = None
+    pending: bool = False  # timed out while being sent; may still complete
+
+
+@dataclass
+class FanOutReport:
+    command: str
+    results: List[SessionResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> int:
+        return sum(1 for r in self.results if r.ok)
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for r in self.results if not r.ok and not r.pending)
+
+    @property
+    def pending(self) -> int:
+        return sum(1 for r in self.results if r.pending)
+
+
+def _ms(start: Optional[float], end: Optional[float]) -> Optional[float]:
+    return round((end - start) * 1000, 1) if start is not None and end is not None else None
+
+
+class VtuberCommandQueue:
+    def __init__(self, client: VtuberClient, history: int = 200) -> None:
+        self.client = client
+        self.history = history
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+        # lane -> heap of (-priority, seq, command)
+        self._lanes: Dict[str, List[Tuple[int, int, VtuberCommand]]] = {}
+        self._last_queued: Dict[str, VtuberCommand] = {}  # most recently enqueued, per lane
+        self._workers: Dict[str, asyncio.Task[None]] = {}
+        self._commands: OrderedDict[int, VtuberCommand] = OrderedDict()
+        # broadcasts exclude session lanes: sessions running vs. a broadcast running
+        self._gate = asyncio.Condition()
+        self._sessions_running = 0
+        self._broadcast_running = False
+
+    def submit(
+        self,
+        kind: str,
+        text: str,
+        *,
+        client_uid: Optional[str] = None,
+        apply_to_all: Optional[bool] = None,
+        mode: str = "append",
+        mergeable: bool = True,
+    ) -> VtuberCommand:
+        if kind not in PRIORITIES:
+            raise ValueError(f"unknown command {kind!r}")
+        cmd = VtuberCommand(next(self._ids), kind, text, client_uid or None, apply_to_all, mode, mergeable=mergeable)
+        self._remember(cmd)
+        last = self._last_queued.get(cmd.lane)
+        if last is not None and last.can_absorb(cmd):
+            last.text = f"{last.text}\n{cmd.text}"
+            last.merged += 1
+            cmd.status = "merged"
+            cmd.merged_into = last.id
+            cmd.merged_with = last
+            return cmd
+        heapq.heappush(self._lanes.setdefault(cmd.lane, []), (-PRIORITIES[kind], next(self._seq), cmd))
+        self._last_queued[cmd.lane] = cmd
+        worker = self._workers.get(cmd.lane)
+        if worker is None or worker.done():
+            self._workers[cmd.lane] = asyncio.get_running_loop().create_task(self._drain(cmd.lane))
+        return cmd
+
+    async def wait(self, cmd: VtuberCommand) -> VtuberCommand:
+        """Wait until ``cmd`` has run; a merged command resolves to the one it was merged into."""
+        while cmd.merged_with is not None:
+            cmd = cmd.merged_with
+        await cmd.finished.wait()
+        return cmd
+
+    def cancel(self, cmd: VtuberCommand, reason: str = "cancelled") -> bool:
+        """Take a queued command out of its lane; False once it has started.
+
+        Commands that others were merged into are not cancelled, as that
+        would drop the merged texts too.
+        """
+        heap = self._lanes.get(cmd.lane)
+        if cmd.status != "queued" or cmd.merged or heap is None:
+            return False
+        heap[:] = [entry for entry in heap if entry[2] is not cmd]
+        heapq.heapify(heap)
+        if self._last_queued.get(cmd.lane) is cmd:
+            del self._last_queued[cmd.lane]
+        cmd.status, cmd.error = "cancelled", reason
+        cmd.finished_at = time.time()
+        cmd.finished.set()
+        return True
+
+    async def fan_out(
+        self,
+        kind: str,
+        text: str,
+        *,
+        client_uids: Optional[Iterable[str]] = None,
+        mode: str = "append",
+        concurrency: int = 8,
+        timeout: float = 10.0,
+    ) -> FanOutReport:
+        """Queue one command per session (all listed sessions by default) and collect the results.
+
+        At most ``concurrency`` of them are outstanding at once. ``timeout``
+        counts from submission, so it includes waiting behind earlier
+        commands of the session. A command still queued at the timeout is
+        cancelled (reported as failed, never sent); one already being sent
+        cannot be recalled and is reported as pending. Fan-out commands are
+        never merged with others, so cancelling one affects nothing else.
+        """
+        if kind not in PRIORITIES:
+            raise ValueError(f"unknown command {kind!r}")
+        uids = client_uids if client_uids is not None else await self.client.list_sessions()
+        uids = [uid for uid in dict.fromkeys(uids) if uid]
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        started = time.perf_counter()
+
+        async def send(uid: str) -> SessionResult:
+            async with semaphore:
+                t0 = time.perf_counter()
+                cmd = self.submit(kind, text, client_uid=uid, mode=mode, mergeable=False)
+                try:
+                    async with asyncio.timeout(timeout):
+                        await self.wait(cmd)
+                except TimeoutError:
+                    latency = round((time.perf_counter() - t0) * 1000, 1)
+                    if self.cancel(cmd, f"timeout after {timeout:g}s in queue"):
+                        return SessionResult(uid, False, latency, None, f"{cmd.error}, not sent")
+                    error = f"timeout after {timeout:g}s, still sending (command #{cmd.id})"
+                    return SessionResult(uid, False, latency, None, error, pending=True)
+                ok = cmd.status == "done"
+                return SessionResult(uid, ok, round((time.perf_counter() - t0) * 1000, 1), cmd.result, cmd.error)
+
+        results = await asyncio.gather(*(send(uid) for uid in uids))
+        return FanOutReport(kind, list(results), time.perf_counter() - started)
+
+    def get(self, command_id: int) -> Optional[VtuberCommand]:
+        return self._commands.get(command_id)
+
+    def recent(self, limit: int = 20) -> List[VtuberCommand]:
+        return list(self._commands.values())[-limit:][::-1]
+
+    def depth(self) -> int:
+        return sum(len(heap) for heap in list(self._lanes.values()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth(),
+            "lanes": {lane: len(heap) for lane, heap in self._lanes.items() if heap},
+            "running": sum(1 for c in self._commands.values() if c.status == "running"),
+        }
+
+    async def stop(self) -> None:
+        """Cancel the workers; queued commands are dropped (marked failed)."""
+        workers = list(self._workers.values())
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        for heap in self._lanes.values():
+            for _, _, cmd in heap:
+                cmd.status, cmd.error = "failed", "queue stopped"
+                cmd.finished.set()
+        self._workers.clear()
+        self._lanes.clear()
+        self._last_queued.clear()
+
+    def _remember(self, cmd: VtuberCommand) -> None:
+        self._commands[cmd.id] = cmd
+        while len(self._commands) > self.history:
+            oldest_id = next(iter(self._commands))
+            if self._commands[oldest_id].status in ("queued", "running"):
+                break
+            self._commands.popitem(last=False)
+
+    async def _drain(self, lane: str) -> None:
+        heap = self._lanes[lane]
+        broadcast = lane == ALL_SESSIONS
+        while heap:
+            async with self._gate:
+                if broadcast:
+                    await self._gate.wait_for(lambda: self._sessions_running == 0)
+                    self._broadcast_running = True
+                else:
+                    # a queued broadcast goes first, so sessions cannot starve it
+                    await self._gate.wait_for(
+                        lambda: not self._broadcast_running and not self._lanes.get(ALL_SESSIONS)
+                    )
+                    self._sessions_running += 1
+            try:
+                if not heap:  # emptied by cancel() while waiting at the gate
+                    break
+                _, _, cmd = heapq.heappop(heap)
+                if self._last_queued.get(lane) is cmd:
+                    del self._last_queued[lane]
+                await self._execute(cmd)
+            finally:
+                async with self._gate:
+                    if broadcast:
+                        self._broadcast_running = False
+                    else:
+                        self._sessions_running -= 1
+                    self._gate.notify_all()
+        self._workers.pop(lane, None)
+
+    async def _execute(self, cmd: VtuberCommand) -> None:
+        cmd.status = "running"
+        cmd.started_at = time.time()
+        VTUBER_QUEUE_WAIT_SECONDS.observe(cmd.started_at - cmd.created_at, kind=cmd.kind)
+        try:
+            if cmd.kind == "speak":
+                cmd.result = await self.client.speak(
+                    text=cmd.text, client_uid=cmd.client_uid, apply_to_all=cmd.apply_to_all
+                )
+            elif cmd.kind == "respond":
+                cmd.result = await self.client.respond(
+                    text=cmd.text, client_uid=cmd.client_uid, apply_to_all=cmd.apply_to_all
+                )
+            else:
+                cmd.result = await self.client.system_instruction(
+                    text=cmd.text, client_uid=cmd.client_uid, mode=cmd.mode, apply_to_all=cmd.apply_to_all
+                )
+            cmd.status = "done"
+        except Exception as e:  # noqa: BLE001 - reported through the command status
+            cmd.status = "failed"
+            cmd.error = str(e) or type(e).__name__
+            logger.warning("VTuber %s #%s failed: %s", cmd.kind, cmd.id, cmd.error)
+        finally:
+            cmd.finished_at = time.time()
+            cmd.finished.set()
+            VTUBER_COMMAND_SECONDS.observe(cmd.finished_at - cmd.started_at, kind=cmd.kind, status=cmd.status)
+
+
+vtuber_queue = VtuberCommandQueue(vtuber_client)
+registry.gauge("evai_vtuber_queue_depth", "VTuber commands waiting to be sent.", vtuber_queue.depth)